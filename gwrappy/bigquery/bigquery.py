@@ -20,6 +20,9 @@ class BigqueryUtility:
         :keyword client_secret_path: File path for client secret JSON file. Only required if credentials are invalid or unavailable.
         :keyword json_credentials_path: File path for automatically generated credentials.
         :keyword client_id: Credentials are stored as a key-value pair per client_id to facilitate multiple clients using the same credentials file. For simplicity, using one's email address is sufficient.
+        :keyword http: Authorized httplib2.Http object, eg. from gwrappy.service.get_http(). Allows connections to be shared across Utility objects.
+        :keyword http_timeout: Socket timeout in seconds for API calls.
+        :type http_timeout: integer
         """
 
         self._service = get_service('bigquery', **kwargs)
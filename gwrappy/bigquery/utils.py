@@ -1,8 +1,8 @@
-import sys
 import os
 import io
 from datetime import datetime
-import humanize
+
+from gwrappy.utils import naturalsize
 
 
 class JobResponse:
@@ -49,12 +49,12 @@ class JobResponse:
 
         if self.job_type == 'load':
             try:
-                setattr(self, 'size', humanize.naturalsize(int(self.resp['statistics']['load']['inputFileBytes'])))
+                setattr(self, 'size', naturalsize(int(self.resp['statistics']['load']['inputFileBytes'])))
             except (KeyError, TypeError):
                 pass
         elif self.job_type == 'query':
             try:
-                setattr(self, 'size', humanize.naturalsize(int(self.resp['statistics']['query']['totalBytesProcessed'])))
+                setattr(self, 'size', naturalsize(int(self.resp['statistics']['query']['totalBytesProcessed'])))
             except (KeyError, TypeError):
                 pass
 
@@ -105,7 +105,7 @@ class TableResponse:
             pass
 
         try:
-            setattr(self, 'size', humanize.naturalsize(int(self.resp['numBytes'])))
+            setattr(self, 'size', naturalsize(int(self.resp['numBytes'])))
         except (KeyError, TypeError):
             pass
 
@@ -181,27 +181,19 @@ def file_to_string(f, source_format='csv'):
 
     assert source_format.lower() in ('csv', 'json')
 
-    # python 2/3 compatibility
-    if sys.version_info.major < 3:
-        output_buffer = io.BytesIO()
-    else:
-        output_buffer = io.StringIO()
+    output_buffer = io.StringIO()
 
     if source_format == 'csv':
+        import csv
         import pandas as pd
 
-        if sys.version_info.major < 3:
-            import unicodecsv as csv
-        else:
-            import csv
-
         string_writer = csv.writer(output_buffer, lineterminator='\n')
 
         # string inputs should only be file paths
         if isinstance(f, str):
             assert os.path.exists(f)
 
-            with io.open(f, 'rb') if sys.version_info.major < 3 else io.open(f, 'r', encoding='utf-8') as read_file:
+            with io.open(f, 'r', encoding='utf-8') as read_file:
                 string_writer.writerows(csv.reader(read_file))
 
         elif isinstance(f, pd.DataFrame):
@@ -19,6 +19,9 @@ class ComputeEngineUtility:
         :keyword client_secret_path: File path for client secret JSON file. Only required if credentials are invalid or unavailable.
         :keyword json_credentials_path: File path for automatically generated credentials.
         :keyword client_id: Credentials are stored as a key-value pair per client_id to facilitate multiple clients using the same credentials file. For simplicity, using one's email address is sufficient.
+        :keyword http: Authorized httplib2.Http object, eg. from gwrappy.service.get_http(). Allows connections to be shared across Utility objects.
+        :keyword http_timeout: Socket timeout in seconds for API calls.
+        :type http_timeout: integer
         """
 
         self._service = get_service('compute', **kwargs)
@@ -254,30 +257,77 @@ class ComputeEngineUtility:
                 operation=operation_name
             ).execute(num_retries=self._max_retries)
 
+    def wait_operation(self, operation_type, location_id, operation_name):
+        """
+        Choose between region or zone operations with operation_type.
+
+        Abstraction of zoneOperations()/regionOperations().wait() method. Blocks server-side till the operation is DONE or roughly 2 minutes have passed, whichever is sooner.
+
+        https://cloud.google.com/compute/docs/reference/latest/zoneOperations/wait
+
+        https://cloud.google.com/compute/docs/reference/latest/regionOperations/wait
+
+        :param operation_type: 'zone' or 'region' type operations.
+        :param location_id: Zone/Region name.
+        :param operation_name: Operation name.
+        :return: ZoneOperations/RegionOperations Resource.
+        """
+
+        assert operation_type in ('region', 'zone')
+
+        if operation_type == 'region':
+            return self._service.regionOperations().wait(
+                project=self.project_id,
+                region=location_id,
+                operation=operation_name
+            ).execute(num_retries=self._max_retries)
+
+        else:
+            return self._service.zoneOperations().wait(
+                project=self.project_id,
+                zone=location_id,
+                operation=operation_name
+            ).execute(num_retries=self._max_retries)
+
     def poll_operation_status(self, operation_type, location_id, operation_name, end_state, sleep_time=0.5):
         """
         Poll operation to until desired end_state is achieved. eg. 'DONE' when adding addresses.
 
+        |  If end_state is 'DONE', the operation is long-polled with wait_operation(), returning as soon as the operation completes without sleeping between calls.
+
         :param operation_type: 'zone' or 'region' type operations.
         :param location_id: Zone/Region name.
         :param operation_name: Operation name.
         :param end_state: Final status that signifies operation is finished.
-        :param sleep_time: Intervals between polls.
+        :param sleep_time: Intervals between polls. Unused if end_state is 'DONE'.
         :return: ZoneOperations/RegionOperations Resource.
         """
 
+        # operations().wait() only returns early once the operation is DONE
+        long_poll = end_state == 'DONE'
+
         status = None
         resp = None
 
         while status != end_state:
-            resp = self.get_operation(
-                operation_type=operation_type,
-                location_id=location_id,
-                operation_name=operation_name
-            )
+            if long_poll:
+                resp = self.wait_operation(
+                    operation_type=operation_type,
+                    location_id=location_id,
+                    operation_name=operation_name
+                )
+
+            else:
+                resp = self.get_operation(
+                    operation_type=operation_type,
+                    location_id=location_id,
+                    operation_name=operation_name
+                )
 
             status = resp['status']
-            sleep(sleep_time)
+
+            if status != end_state and not long_poll:
+                sleep(sleep_time)
 
         return resp
 
@@ -1 +1 @@
-from gwrappy.dataproc.dataproc import DataprocUtility
+from gwrappy.dataproc.dataproc import DataprocUtility, AsyncDataprocUtility
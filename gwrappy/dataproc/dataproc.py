@@ -1,8 +1,210 @@
-from gwrappy.service import get_service
-from gwrappy.utils import iterate_list
+from gwrappy.service import get_service, get_credentials, get_http
+from gwrappy.utils import iterate_list, execute_batch
+from gwrappy.errors import HttpError, PollingCancelled
 from gwrappy.dataproc.utils import OperationResponse, JobResponse
 
-from time import sleep
+from time import sleep, monotonic
+from threading import RLock, Event, local
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import itertools
+import random
+
+from cachetools import TTLCache
+
+_DEFAULT_DISK = {'bootDiskSizeGb': 500, 'numLocalSsds': 0}
+
+_OPERATIONS_NAME = 'projects/%s/regions/global/operations'
+
+# partial response masks while polling, the full resource is only fetched once complete
+_OPERATION_POLL_FIELDS = 'name,done'
+_JOB_POLL_FIELDS = 'reference/jobId,status/state'
+
+# job states after which a job will not change state again
+_TERMINAL_JOB_STATES = frozenset(('DONE', 'ERROR', 'CANCELLED'))
+
+
+def _backoff_iter(initial, factor=2.0, cap=30.0, jitter=0.1):
+    # exponentially increasing sleep times, capped and jittered to avoid polling in lockstep
+    delay = min(cap, initial)
+    while True:
+        yield delay * (1 + random.uniform(-jitter, jitter))
+        delay = min(cap, delay * factor)
+
+
+def _adaptive_iter(initial, cap=30.0):
+    # a tenth of the time elapsed so far, so longer running operations are polled less often
+    start_time = monotonic()
+    while True:
+        yield max(initial, min(cap, (monotonic() - start_time) / 10.0))
+
+
+def _poll_delays(polling_strategy, sleep_time, backoff_factor=2.0, max_sleep_time=30.0):
+    if polling_strategy == 'fixed':
+        return itertools.repeat(sleep_time)
+    elif polling_strategy == 'exp':
+        return _backoff_iter(sleep_time, backoff_factor, max_sleep_time)
+    elif polling_strategy == 'adaptive':
+        return _adaptive_iter(sleep_time, max_sleep_time)
+    else:
+        raise ValueError('polling_strategy must be one of fixed, exp or adaptive, got %s' % polling_strategy)
+
+
+def _poll(fetch, is_done, resource_name, delays, timeout=None, max_consecutive_failures=5, wait=sleep):
+    # calls fetch() till is_done(resp), waiting for the next of delays between calls
+    # wait returning True, as threading.Event.wait() does once the event is set, cancels the poll
+    # server errors and incomplete responses are retried till max_consecutive_failures is reached
+    start_time = monotonic()
+    failures = 0
+    resp = None
+    is_complete = False
+
+    while not is_complete:
+        try:
+            resp = fetch()
+            is_complete = is_done(resp)
+
+        except (HttpError, KeyError) as e:
+            if isinstance(e, HttpError) and e.resp.status < 500:
+                raise
+
+            failures += 1
+            if failures >= max_consecutive_failures:
+                raise
+
+        else:
+            failures = 0
+
+        if not is_complete:
+            if timeout is not None and monotonic() - start_time > timeout:
+                raise TimeoutError(resource_name)
+
+            if wait(next(delays)):
+                raise PollingCancelled(resource_name)
+
+    return resp
+
+
+async def _apoll(fetch, is_done, resource_name, delays, timeout=None, max_consecutive_failures=5):
+    # coroutine counterpart of _poll, fetch being a coroutine function and waits yielding to the event loop
+    start_time = monotonic()
+    failures = 0
+    resp = None
+    is_complete = False
+
+    while not is_complete:
+        try:
+            resp = await fetch()
+            is_complete = is_done(resp)
+
+        except (HttpError, KeyError) as e:
+            if isinstance(e, HttpError) and e.resp.status < 500:
+                raise
+
+            failures += 1
+            if failures >= max_consecutive_failures:
+                raise
+
+        else:
+            failures = 0
+
+        if not is_complete:
+            if timeout is not None and monotonic() - start_time > timeout:
+                raise TimeoutError(resource_name)
+
+            await asyncio.sleep(next(delays))
+
+    return resp
+
+
+def _build_cluster_body(project_id, zone, cluster_name, **kwargs):
+    init_actions = kwargs.get('init_actions') or ()
+    if isinstance(init_actions, str):
+        init_actions = (init_actions,)
+
+    return {
+        'clusterName': cluster_name,
+        'projectId': project_id,
+        'config': {
+            'configBucket': kwargs.get('config_bucket', ''),
+            # short names are expanded to full resource URIs by the API
+            'gceClusterConfig': {
+                'networkUri': kwargs.get('network', 'default'),
+                'zoneUri': zone
+            },
+            'masterConfig': {
+                'numInstances': kwargs.get('master_num', 1),
+                'machineTypeUri': kwargs.get('master_machine_type', 'n1-standard-4'),
+                'diskConfig': dict(_DEFAULT_DISK, bootDiskSizeGb=kwargs.get('master_boot_disk', 500))
+            },
+            'workerConfig': {
+                'numInstances': kwargs.get('worker_num', 2),
+                'machineTypeUri': kwargs.get('worker_machine_type', 'n1-standard-4'),
+                'diskConfig': dict(_DEFAULT_DISK, bootDiskSizeGb=kwargs.get('worker_boot_disk', 500))
+            },
+            'initializationActions': [{'executableFile': x} for x in init_actions]
+        }
+    }
+
+
+# (kwarg, request body key, expected type), missing kwargs are left out of the request body
+_SPARK_FIELDS = (
+    ('args', 'args', list),
+    ('jar_uris', 'jarFileUris', list),
+    ('file_uris', 'fileUris', list),
+    ('archive_uris', 'archiveUris', list),
+    ('properties', 'properties', dict)
+)
+
+_PYSPARK_FIELDS = (
+    ('args', 'args', list),
+    ('python_uris', 'pythonFileUris', list),
+    ('jar_uris', 'jarFileUris', list),
+    ('file_uris', 'fileUris', list),
+    ('archive_uris', 'archiveUris', list),
+    ('properties', 'properties', dict)
+)
+
+
+def _get_checked(kwargs, fields):
+    # single lookup per field, unset fields are omitted since the API treats them as empty
+    checked = {}
+    for key, body_key, expected_type in fields:
+        value = kwargs.get(key)
+
+        if value is None:
+            continue
+
+        if not isinstance(value, expected_type):
+            raise TypeError('%s must be %s, got %s' % (key, expected_type.__name__, type(value).__name__))
+
+        checked[body_key] = value
+
+    return checked
+
+
+def _build_spark_job(main_class, **kwargs):
+    spark_job = _get_checked(kwargs, _SPARK_FIELDS)
+    spark_job['mainClass'] = main_class
+    return spark_job
+
+
+def _build_pyspark_job(main_py_uri, **kwargs):
+    pyspark_job = _get_checked(kwargs, _PYSPARK_FIELDS)
+    pyspark_job['mainPythonFileUri'] = main_py_uri
+    return pyspark_job
+
+
+def _build_job_body(cluster_name, job_key, job_config):
+    # job_key being the job type, eg. sparkJob, pysparkJob
+    return {
+        'job': {
+            'placement': {
+                'clusterName': cluster_name
+            },
+            job_key: job_config
+        }
+    }
 
 
 class DataprocUtility:
@@ -17,13 +219,44 @@ class DataprocUtility:
         :keyword client_secret_path: File path for client secret JSON file. Only required if credentials are invalid or unavailable.
         :keyword json_credentials_path: File path for automatically generated credentials.
         :keyword client_id: Credentials are stored as a key-value pair per client_id to facilitate multiple clients using the same credentials file. For simplicity, using one's email address is sufficient.
+        :keyword http: Authorized httplib2.Http object, eg. from gwrappy.service.get_http(). Allows connections to be shared across Utility objects.
+        :keyword http_timeout: Socket timeout in seconds for API calls.
+        :type http_timeout: integer
+        :keyword cluster_cache_ttl: Seconds cluster resources returned by get_cluster(use_cache=True) are cached for.
+        :type cluster_cache_ttl: integer
         """
 
         self.project_id = project_id
         self._service = get_service('dataproc', **kwargs)
+
+        # resource objects are reused across calls rather than rebuilt from the service each time
+        regions = self._service.projects().regions()
+        self._clusters = regions.clusters()
+        self._jobs = regions.jobs()
+        self._operations = regions.operations()
         self._max_retries = kwargs.get('max_retries', 3)
 
-    def list_clusters(self, max_results=None, filter=None):
+        self._cluster_cache = TTLCache(maxsize=128, ttl=kwargs.get('cluster_cache_ttl', 300))
+        self._cluster_lock = RLock()
+
+        # set by cancel_polls() to interrupt waits between polls
+        self._stop = Event()
+
+    def cancel_polls(self):
+        """
+        Interrupts in-progress and future polls of this object, which raise PollingCancelled instead of waiting for completion. Undo with resume_polls().
+        """
+
+        self._stop.set()
+
+    def resume_polls(self):
+        """
+        Allows polling again after cancel_polls().
+        """
+
+        self._stop.clear()
+
+    def list_clusters(self, max_results=None, filter=None, prefetch=False):
         """
         Abstraction of projects().regions().clusters().list() method with inbuilt iteration functionality. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.clusters/list]
 
@@ -31,35 +264,122 @@ class DataprocUtility:
         :type max_results: integer
         :param filter: Query param [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.clusters/list#query-parameters]
         :type filter: String
-        :return: List of dictionary objects representing cluster resources.
+        :param prefetch: If True, the next page is fetched in a background thread while the current page is iterated over. Avoid making other calls with this object while iterating.
+        :type prefetch: boolean
+        :return: Generator of dictionary objects representing cluster resources.
         """
 
         return iterate_list(
-            self._service.projects().regions().clusters(),
+            self._clusters,
             'clusters',
             max_results,
             self._max_retries,
+            prefetch=prefetch,
             projectId=self.project_id,
             region='global',
             filter=filter
          )
 
-    def get_cluster(self, cluster_name):
+    def _list_multi(self, resource, object_name, requests, max_results=None):
+        results = dict((key, []) for key in requests)
+
+        # each round batches one page per key, until all keys are exhausted
+        while len(requests) > 0:
+            next_requests = {}
+
+            for key, resp in execute_batch(self._service, requests, max_retries=self._max_retries).items():
+                if isinstance(resp, Exception):
+                    raise resp
+
+                results[key].extend(resp.get(object_name, []))
+
+                if max_results is not None and len(results[key]) >= max_results:
+                    del results[key][max_results:]
+                    continue
+
+                next_request = resource.list_next(requests[key], resp)
+                if next_request is not None:
+                    next_requests[key] = next_request
+
+            requests = next_requests
+
+        return results
+
+    def _get_multi(self, requests):
+        results = execute_batch(self._service, requests, max_retries=self._max_retries)
+
+        for resp in results.values():
+            if isinstance(resp, Exception):
+                raise resp
+
+        return results
+
+    def list_clusters_multi(self, project_ids, max_results=None, filter=None):
         """
-        Abstraction of projects().regions().clusters().get() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.clusters/get]
+        Batched projects().regions().clusters().list() across multiple projects. Pages for all projects are fetched in a single HTTP call per round.
 
-        :param cluster_name: Cluster name.
-        :return: Dictionary object representing cluster resource.
+        :param project_ids: Project IDs to list clusters for.
+        :type project_ids: list
+        :param max_results: If None, all results are iterated over and returned. Applies per project.
+        :type max_results: integer
+        :param filter: Query param [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.clusters/list#query-parameters]
+        :type filter: String
+        :return: Dictionary keyed by project_id, with values being lists of dictionary objects representing cluster resources.
         """
 
-        cluster_resp = self._service.projects().regions().clusters().get(
+        return self._list_multi(
+            self._clusters,
+            'clusters',
+            dict(
+                (project_id, self._clusters.list(projectId=project_id, region='global', filter=filter))
+                for project_id in project_ids
+            ),
+            max_results
+        )
+
+    def _get_cluster_uncached(self, cluster_name):
+        return self._clusters.get(
             projectId=self.project_id,
             region='global',
             clusterName=cluster_name
         ).execute(num_retries=self._max_retries)
 
+    def get_cluster(self, cluster_name, use_cache=False):
+        """
+        Abstraction of projects().regions().clusters().get() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.clusters/get]
+
+        **Note** - With use_cache=True, responses are cached for *cluster_cache_ttl* seconds, so cluster status may be stale. Don't use the cache when polling for status changes.
+
+        :param cluster_name: Cluster name.
+        :param use_cache: If True, returns the cached cluster resource if available. If False, always queries the API and refreshes the cached cluster resource.
+        :type use_cache: boolean
+        :return: Dictionary object representing cluster resource.
+        """
+
+        if use_cache:
+            with self._cluster_lock:
+                cluster_resp = self._cluster_cache.get(cluster_name)
+
+            if cluster_resp is not None:
+                return cluster_resp
+
+        cluster_resp = self._get_cluster_uncached(cluster_name)
+
+        with self._cluster_lock:
+            self._cluster_cache[cluster_name] = cluster_resp
+
         return cluster_resp
 
+    def invalidate_cluster(self, cluster_name):
+        """
+        Removes cluster resource from the get_cluster() cache.
+
+        :param cluster_name: Cluster name.
+        """
+
+        with self._cluster_lock:
+            self._cluster_cache.pop(cluster_name, None)
+
     def diagnose_cluster(self, cluster_name):
         """
         Abstraction of projects().regions().clusters().diagnose() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.clusters/diagnose]
@@ -68,7 +388,7 @@ class DataprocUtility:
         :return: Dictionary object representing operation resource.
         """
 
-        cluster_resp = self._service.projects().regions().clusters().diagnose(
+        cluster_resp = self._clusters.diagnose(
             projectId=self.project_id,
             region='global',
             clusterName=cluster_name,
@@ -77,7 +397,7 @@ class DataprocUtility:
 
         return cluster_resp
 
-    def list_operations(self, max_results=None, filter=None):
+    def list_operations(self, max_results=None, filter=None, prefetch=False):
         """
         Abstraction of projects().regions().operations().list() method with inbuilt iteration functionality. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.operations/list]
 
@@ -85,55 +405,190 @@ class DataprocUtility:
         :type max_results: integer
         :param filter: Query param [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.operations/list#query-parameters]
         :type filter: String
-        :return: List of dictionary objects representing operation resources.
+        :param prefetch: If True, the next page is fetched in a background thread while the current page is iterated over. Avoid making other calls with this object while iterating.
+        :type prefetch: boolean
+        :return: Generator of dictionary objects representing operation resources.
         """
 
         return iterate_list(
-            self._service.projects().regions().operations(),
+            self._operations,
             'operations',
             max_results,
             self._max_retries,
-            name='projects/{project_id}/regions/{region}/operations'.format(project_id=self.project_id, region='global'),
+            prefetch=prefetch,
+            name=_OPERATIONS_NAME % self.project_id,
             filter=filter
          )
 
-    def get_operation(self, operation_name):
+    def list_operations_multi(self, project_ids, max_results=None, filter=None):
+        """
+        Batched projects().regions().operations().list() across multiple projects. Pages for all projects are fetched in a single HTTP call per round.
+
+        :param project_ids: Project IDs to list operations for.
+        :type project_ids: list
+        :param max_results: If None, all results are iterated over and returned. Applies per project.
+        :type max_results: integer
+        :param filter: Query param [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.operations/list#query-parameters]
+        :type filter: String
+        :return: Dictionary keyed by project_id, with values being lists of dictionary objects representing operation resources.
+        """
+
+        return self._list_multi(
+            self._operations,
+            'operations',
+            dict(
+                (
+                    project_id,
+                    self._operations.list(
+                        name=_OPERATIONS_NAME % project_id,
+                        filter=filter
+                    )
+                )
+                for project_id in project_ids
+            ),
+            max_results
+        )
+
+    def get_operation(self, operation_name, fields=None):
         """
         Abstraction of projects().regions().operations().get() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.operations/get]
 
         :param operation_name: Name of operation resource.
+        :param fields: Partial response mask, eg. 'name,done'. If None, the full resource is returned.
         :return: Dictionary object representing operation resource.
         """
 
-        operation_resp = self._service.projects().regions().operations().get(
-            name=operation_name
+        operation_resp = self._operations.get(
+            name=operation_name,
+            fields=fields
         ).execute(num_retries=self._max_retries)
 
         return operation_resp
 
-    def poll_operation_status(self, operation_resp, sleep_time=3):
+    def get_operations(self, operation_names):
+        """
+        Batched projects().regions().operations().get() method, fetching up to 1000 operations per HTTP request.
+
+        :param operation_names: Names of operation resources.
+        :type operation_names: list
+        :return: Dictionary of operation name to dictionary object representing operation resource.
+        :raises: HttpError if any request fails.
+        """
+
+        return self._get_multi(
+            dict((name, self._operations.get(name=name)) for name in operation_names)
+        )
+
+    def poll_operation_status(self, operation_resp, sleep_time=3, max_sleep_time=30, backoff_factor=2.0,
+                              timeout=None, max_consecutive_failures=5, polling_strategy='exp'):
         """
         Abstraction of projects().regions().operations().get() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.operations/get]
 
+        Polls till the operation's *done* field is True.
+
         :param operation_resp: Representation of operation resource.
-        :param sleep_time: If wait_finish is set to True, sets polling wait time.
+        :param sleep_time: If wait_finish is set to True, sets initial polling wait time.
+        :param max_sleep_time: Upper bound of polling wait time.
+        :param backoff_factor: Multiplier applied to polling wait time after each poll.
+        :param timeout: If set, seconds to poll for before raising TimeoutError.
+        :param max_consecutive_failures: Number of consecutive server errors or incomplete responses tolerated before raising.
+        :param polling_strategy: 'exp' grows the wait time by backoff_factor after each poll, 'fixed' always waits sleep_time, 'adaptive' waits a tenth of the time elapsed so far, bounded by sleep_time and max_sleep_time.
         :return: Dictionary object representing operation resource.
+        :raises: TimeoutError if timeout is exceeded, PollingCancelled if cancel_polls() is called, HttpError if non-retryable errors are encountered.
         """
 
-        is_complete = False
+        operation_name = operation_resp['name']
+
+        _poll(
+            lambda: self.get_operation(operation_name, fields=_OPERATION_POLL_FIELDS),
+            # done is the authoritative completion signal, metadata may not be populated for pending operations
+            lambda resp: resp.get('done') is True,
+            operation_name,
+            _poll_delays(polling_strategy, sleep_time, backoff_factor, max_sleep_time),
+            timeout,
+            max_consecutive_failures,
+            wait=self._stop.wait
+        )
+
+        operation_resp = self.get_operation(operation_name)
 
-        while not is_complete:
-            operation_resp = self._service.projects().regions().operations().get(
-                name=operation_resp['name']
-            ).execute(num_retries=self._max_retries)
+        return OperationResponse(operation_resp)
 
-            is_complete = operation_resp.get('done', False) or \
-                          operation_resp['metadata']['status']['state'] == 'DONE'
+    def wait_for_operation(self, operation_name, **kwargs):
+        """
+        Polls operation till completion. Accepts the same keyword arguments as poll_operation_status().
 
-            if not is_complete:
-                sleep(sleep_time)
+        :param operation_name: Name of operation resource, eg. from create_cluster(wait_finish=False)['name'].
+        :return: OperationResponse object.
+        """
 
-        return OperationResponse(operation_resp)
+        return self.poll_operation_status({'name': operation_name}, **kwargs)
+
+    def wait_for_operations(self, operation_names, sleep_time=3, max_sleep_time=30, backoff_factor=2.0, timeout=None,
+                            max_consecutive_failures=5, polling_strategy='exp'):
+        """
+        Polls multiple operations till all have completed, fetching every pending operation in a single batched request per poll.
+
+        |  Start operations with wait_finish=False, then wait on them together instead of one after another.
+        |  eg. ops = [dataproc_obj.create_cluster(zone, name, wait_finish=False) for name in cluster_names]
+        |  dataproc_obj.wait_for_operations([op['name'] for op in ops])
+
+        :param operation_names: Names of operation resources.
+        :type operation_names: list
+        :param sleep_time: Initial polling wait time.
+        :param max_sleep_time: Upper bound of polling wait time.
+        :param backoff_factor: Multiplier applied to polling wait time after each poll.
+        :param timeout: If set, seconds to poll for before raising TimeoutError.
+        :param max_consecutive_failures: Number of consecutive polls with server errors tolerated before raising.
+        :param polling_strategy: 'exp', 'fixed' or 'adaptive'. Refer to poll_operation_status().
+        :return: Dictionary of operation name to OperationResponse object.
+        :raises: TimeoutError if timeout is exceeded, PollingCancelled if cancel_polls() is called, HttpError if non-retryable errors are encountered.
+        """
+
+        backoff = _poll_delays(polling_strategy, sleep_time, backoff_factor, max_sleep_time)
+        start_time = monotonic()
+        failures = 0
+
+        pending = set(operation_names)
+        results = {}
+
+        while len(pending) > 0:
+            responses = execute_batch(
+                self._service,
+                dict((name, self._operations.get(name=name)) for name in pending)
+            )
+
+            failed = False
+            for name, operation_resp in responses.items():
+                if isinstance(operation_resp, HttpError):
+                    if operation_resp.resp.status < 500:
+                        raise operation_resp
+
+                    failed = True
+                    continue
+
+                if isinstance(operation_resp, Exception):
+                    raise operation_resp
+
+                if operation_resp.get('done') is True:
+                    results[name] = OperationResponse(operation_resp)
+                    pending.discard(name)
+
+            if failed:
+                failures += 1
+                if failures >= max_consecutive_failures:
+                    raise next(e for e in responses.values() if isinstance(e, HttpError))
+            else:
+                failures = 0
+
+            if len(pending) > 0:
+                if timeout is not None and monotonic() - start_time > timeout:
+                    raise TimeoutError(', '.join(sorted(pending)))
+
+                if self._stop.wait(next(backoff)):
+                    raise PollingCancelled(', '.join(sorted(pending)))
+
+        return results
 
     def create_cluster(self, zone, cluster_name, wait_finish=True, sleep_time=3, **kwargs):
         """
@@ -141,7 +596,7 @@ class DataprocUtility:
 
         :param zone: Dataproc zone.
         :param cluster_name: Cluster name.
-        :param wait_finish: If set to True, operation will be polled till completion.
+        :param wait_finish: If set to True, operation will be polled till completion. Set to False and use wait_for_operations() to create multiple clusters concurrently.
         :param sleep_time: If wait_finish is set to True, sets polling wait time.
 
         :keyword config_bucket: Google Cloud Storage staging bucket used for sharing generated SSH keys and config.
@@ -159,59 +614,16 @@ class DataprocUtility:
         :return: Dictionary object or OperationResponse representing cluster resource.
         """
 
-        init_actions = kwargs.get('init_actions', [])
-        if not isinstance(init_actions, list):
-            init_actions = [init_actions]
-
-        cluster_body = {
-            'clusterName': cluster_name,
-            'projectId': self.project_id,
-            'config': {
-                'configBucket': kwargs.get('config_bucket', ''),
-                'gceClusterConfig': {
-                    'networkUri': 'https://www.googleapis.com/compute/v1/projects/{project_id}/global/networks/{network}'.format(
-                        project_id=self.project_id,
-                        network=kwargs.get('network', 'default')
-                    ),
-                    'zoneUri': 'https://www.googleapis.com/compute/v1/projects/{project_id}/zones/{zone}'.format(
-                        project_id=self.project_id,
-                        zone=zone
-                    )
-                },
-                'masterConfig': {
-                    'numInstances': kwargs.get('master_num', 1),
-                    'machineTypeUri': 'https://www.googleapis.com/compute/v1/projects/{project_id}/zones/{zone}/machineTypes/{master_machine_type}'.format(
-                        project_id=self.project_id,
-                        zone=zone,
-                        master_machine_type=kwargs.get('master_machine_type', 'n1-standard-4')
-                    ),
-                    'diskConfig': {
-                        'bootDiskSizeGb': kwargs.get('master_boot_disk', 500),
-                        'numLocalSsds': 0
-                    }
-                },
-                'workerConfig': {
-                    'numInstances': kwargs.get('worker_num', 2),
-                    'machineTypeUri': 'https://www.googleapis.com/compute/v1/projects/{project_id}/zones/{zone}/machineTypes/{worker_machine_type}'.format(
-                        project_id=self.project_id,
-                        zone=zone,
-                        worker_machine_type=kwargs.get('worker_machine_type', 'n1-standard-4')
-                    ),
-                    'diskConfig': {
-                        'bootDiskSizeGb': kwargs.get('worker_boot_disk', 500),
-                        'numLocalSsds': 0
-                    }
-                },
-                'initializationActions': [{'executableFile': x} for x in init_actions]
-            }
-        }
+        cluster_body = _build_cluster_body(self.project_id, zone, cluster_name, **kwargs)
 
-        cluster_resp = self._service.projects().regions().clusters().create(
+        cluster_resp = self._clusters.create(
             projectId=self.project_id,
             region='global',
             body=cluster_body
         ).execute(num_retries=self._max_retries)
 
+        self.invalidate_cluster(cluster_name)
+
         if wait_finish:
             return self.poll_operation_status(cluster_resp, sleep_time)
         else:
@@ -222,23 +634,25 @@ class DataprocUtility:
         Abstraction of projects().regions().clusters().delete() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.clusters/delete]
 
         :param cluster_name: Cluster name.
-        :param wait_finish: If set to True, operation will be polled till completion.
+        :param wait_finish: If set to True, operation will be polled till completion. Set to False and use wait_for_operations() to delete multiple clusters concurrently.
         :param sleep_time: If wait_finish is set to True, sets polling wait time.
         :return: Dictionary object or OperationResponse representing cluster resource.
         """
 
-        cluster_resp = self._service.projects().regions().clusters().delete(
+        cluster_resp = self._clusters.delete(
             projectId=self.project_id,
             region='global',
             clusterName=cluster_name
         ).execute(num_retries=self._max_retries)
 
+        self.invalidate_cluster(cluster_name)
+
         if wait_finish:
             return self.poll_operation_status(cluster_resp, sleep_time)
         else:
             return cluster_resp
 
-    def list_jobs(self, cluster_name=None, job_state='ACTIVE', max_results=None, filter=None):
+    def list_jobs(self, cluster_name=None, job_state='ACTIVE', max_results=None, filter=None, prefetch=False):
         """
         Abstraction of projects().regions().jobs().list() method with inbuilt iteration functionality. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.jobs/list]
 
@@ -248,14 +662,17 @@ class DataprocUtility:
         :type max_results: integer
         :param filter: Query param [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.jobs/list#query-parameters]
         :type filter: String
-        :return: List of dictionary objects representing cluster resources.
+        :param prefetch: If True, the next page is fetched in a background thread while the current page is iterated over. Avoid making other calls with this object while iterating.
+        :type prefetch: boolean
+        :return: Generator of dictionary objects representing job resources.
         """
 
         return iterate_list(
-            self._service.projects().regions().jobs(),
+            self._jobs,
             'jobs',
             max_results,
             self._max_retries,
+            prefetch=prefetch,
             projectId=self.project_id,
             region='global',
             clusterName=cluster_name,
@@ -263,41 +680,114 @@ class DataprocUtility:
             filter=filter
         )
 
-    def get_job(self, job_id):
+    def list_jobs_multi(self, project_ids, cluster_name=None, job_state='ACTIVE', max_results=None, filter=None):
+        """
+        Batched projects().regions().jobs().list() across multiple projects. Pages for all projects are fetched in a single HTTP call per round.
+
+        :param project_ids: Project IDs to list jobs for.
+        :type project_ids: list
+        :param cluster_name: Cluster name, if unset, will return jobs from all clusters.
+        :param job_state: Category of jobs to return. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.jobs/list#JobStateMatcher]
+        :param max_results: If None, all results are iterated over and returned. Applies per project.
+        :type max_results: integer
+        :param filter: Query param [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.jobs/list#query-parameters]
+        :type filter: String
+        :return: Dictionary keyed by project_id, with values being lists of dictionary objects representing job resources.
+        """
+
+        return self._list_multi(
+            self._jobs,
+            'jobs',
+            dict(
+                (
+                    project_id,
+                    self._jobs.list(
+                        projectId=project_id,
+                        region='global',
+                        clusterName=cluster_name,
+                        jobStateMatcher=job_state,
+                        filter=filter
+                    )
+                )
+                for project_id in project_ids
+            ),
+            max_results
+        )
+
+    def get_job(self, job_id, fields=None):
         """
         Abstraction of projects().regions().jobs().get() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.jobs/get]
 
         :param job_id: Job Id.
+        :param fields: Partial response mask, eg. 'status'. If None, the full resource is returned.
         :return: Dictionary object representing job resource.
         """
 
-        job_resp = self._service.projects().regions().jobs().get(
+        job_resp = self._jobs.get(
             projectId=self.project_id,
             region='global',
-            jobId=job_id
+            jobId=job_id,
+            fields=fields
         ).execute(num_retries=self._max_retries)
 
         return job_resp
 
-    def poll_job_status(self, job_resp, sleep_time=3):
+    def get_jobs(self, job_ids):
+        """
+        Batched projects().regions().jobs().get() method, fetching up to 1000 jobs per HTTP request.
+
+        :param job_ids: Job Ids.
+        :type job_ids: list
+        :return: Dictionary of job id to dictionary object representing job resource.
+        :raises: HttpError if any request fails.
+        """
+
+        return self._get_multi(
+            dict((job_id, self._jobs.get(projectId=self.project_id, region='global', jobId=job_id)) for job_id in job_ids)
+        )
+
+    def poll_job_status(self, job_resp, sleep_time=3, max_sleep_time=30, backoff_factor=2.0,
+                        timeout=None, max_consecutive_failures=5, polling_strategy='exp'):
         """
         :param job_resp: Representation of job resource.
-        :param sleep_time: If wait_finish is set to True, sets polling wait time.
+        :param sleep_time: If wait_finish is set to True, sets initial polling wait time.
+        :param max_sleep_time: Upper bound of polling wait time.
+        :param backoff_factor: Multiplier applied to polling wait time after each poll.
+        :param timeout: If set, seconds to poll for before raising TimeoutError.
+        :param max_consecutive_failures: Number of consecutive server errors or incomplete responses tolerated before raising.
+        :param polling_strategy: 'exp' grows the wait time by backoff_factor after each poll, 'fixed' always waits sleep_time, 'adaptive' waits a tenth of the time elapsed so far, bounded by sleep_time and max_sleep_time.
         :return: Dictionary object representing job resource.
+        :raises: TimeoutError if timeout is exceeded, PollingCancelled if cancel_polls() is called, HttpError if non-retryable errors are encountered.
         """
 
-        is_complete = False
-
-        while not is_complete:
-            job_resp = self.get_job(job_resp['reference']['jobId'])
+        job_id = job_resp['reference']['jobId']
 
-            is_complete = job_resp['status']['state'] in ('DONE', 'ERROR', 'CANCELLED')
+        _poll(
+            lambda: self.get_job(job_id, fields=_JOB_POLL_FIELDS),
+            lambda resp: resp['status']['state'] in _TERMINAL_JOB_STATES,
+            job_id,
+            _poll_delays(polling_strategy, sleep_time, backoff_factor, max_sleep_time),
+            timeout,
+            max_consecutive_failures,
+            wait=self._stop.wait
+        )
 
-            if not is_complete:
-                sleep(sleep_time)
+        job_resp = self.get_job(job_id)
 
         return JobResponse(job_resp)
 
+    def _submit_job(self, cluster_name, job_key, job_config, wait_finish, sleep_time):
+        job_resp = self._jobs.submit(
+            projectId=self.project_id,
+            region='global',
+            body=_build_job_body(cluster_name, job_key, job_config)
+        ).execute(num_retries=self._max_retries)
+
+        if wait_finish:
+            return self.poll_job_status(job_resp, sleep_time)
+        else:
+            return job_resp
+
     def submit_spark_job(self, cluster_name, main_class, wait_finish=True, sleep_time=5, **kwargs):
         """
         Abstraction of projects().regions().jobs().submit() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.jobs/submit]
@@ -316,39 +806,13 @@ class DataprocUtility:
         :return: Dictionary object or JobResponse representing job resource.
         """
 
-        # validate fields
-        assert isinstance(kwargs.get('args', []), list)
-        assert isinstance(kwargs.get('jar_uris', []), list)
-        assert isinstance(kwargs.get('file_uris', []), list)
-        assert isinstance(kwargs.get('archive_uris', []), list)
-        assert isinstance(kwargs.get('properties', {}), dict)
-
-        submit_body = {
-            'job': {
-                'placement': {
-                    'clusterName': cluster_name
-                },
-                'sparkJob': {
-                    'mainClass': main_class,
-                    'args': kwargs.get('args', []),
-                    'jarFileUris': kwargs.get('jar_uris', []),
-                    'fileUris': kwargs.get('file_uris', []),
-                    'archiveUris': kwargs.get('archive_uris', []),
-                    'properties': kwargs.get('properties', {})
-                }
-            }
-        }
-
-        job_resp = self._service.projects().regions().jobs().submit(
-            projectId=self.project_id,
-            region='global',
-            body=submit_body
-        ).execute(num_retries=self._max_retries)
-
-        if wait_finish:
-            return self.poll_job_status(job_resp, sleep_time)
-        else:
-            return job_resp
+        return self._submit_job(
+            cluster_name,
+            'sparkJob',
+            _build_spark_job(main_class, **kwargs),
+            wait_finish,
+            sleep_time
+        )
 
     def submit_pyspark_job(self, cluster_name, main_py_uri, wait_finish=True, sleep_time=5, **kwargs):
         """
@@ -369,38 +833,288 @@ class DataprocUtility:
         :return: Dictionary object or JobResponse representing job resource.
         """
 
-        # validate fields
-        assert isinstance(kwargs.get('args', []), list)
-        assert isinstance(kwargs.get('python_uris', []), list)
-        assert isinstance(kwargs.get('jar_uris', []), list)
-        assert isinstance(kwargs.get('file_uris', []), list)
-        assert isinstance(kwargs.get('archive_uris', []), list)
-        assert isinstance(kwargs.get('properties', {}), dict)
+        return self._submit_job(
+            cluster_name,
+            'pysparkJob',
+            _build_pyspark_job(main_py_uri, **kwargs),
+            wait_finish,
+            sleep_time
+        )
 
-        submit_body = {
-            'placement': {
-                'clusterName': cluster_name
-            },
-            'job': {
-                'pysparkJob': {
-                    'mainPythonFileUri': main_py_uri,
-                    'args': kwargs.get('args', []),
-                    'pythonFileUris': kwargs.get('python_uris', []),
-                    'jarFileUris': kwargs.get('jar_uris', []),
-                    'fileUris': kwargs.get('file_uris', []),
-                    'archiveUris': kwargs.get('archive_uris', []),
-                    'properties': kwargs.get('properties', {})
-                }
-            }
-        }
 
-        job_resp = self._service.projects().regions().jobs().submit(
-            projectId=self.project_id,
-            region='global',
-            body=submit_body
-        ).execute(num_retries=self._max_retries)
+class AsyncDataprocUtility:
+    def __init__(self, project_id, **kwargs):
+        """
+        asyncio counterpart of DataprocUtility's operation and job methods, allowing a single event loop to orchestrate multiple clusters and jobs concurrently.
+
+        |  API calls are executed in a thread pool, each thread with its own authorized Http object. Polling waits with asyncio.sleep() and uses the same capped exponential backoff as DataprocUtility.
+        |  eg. await asyncio.gather(*[dataproc_obj.create_cluster(zone, name) for name in cluster_names])
+        |  Use as an async context manager, or call close(), to shut down the thread pool once done.
+        |  As each thread authorizes its own connection, the *http* kwarg accepted by DataprocUtility isn't supported.
+
+        :param project_id: Project ID linked to Dataproc.
+        :keyword max_workers: Number of threads API calls are executed in.
+        :type max_workers: integer
+        :keyword client_secret_path: File path for client secret JSON file. Only required if credentials are invalid or unavailable.
+        :keyword json_credentials_path: File path for automatically generated credentials.
+        :keyword client_id: Credentials are stored as a key-value pair per client_id to facilitate multiple clients using the same credentials file. For simplicity, using one's email address is sufficient.
+        :keyword http_timeout: Socket timeout in seconds for API calls.
+        :type http_timeout: integer
+        """
+
+        assert 'http' not in kwargs, 'http not supported, each worker thread authorizes its own connection'
+
+        self.project_id = project_id
+        self._max_retries = kwargs.get('max_retries', 3)
+
+        self._credentials = get_credentials('dataproc', **kwargs)
+        self._http_timeout = kwargs.get('http_timeout', None)
+        self._service = get_service('dataproc', http=get_http(self._credentials, self._http_timeout))
+
+        regions = self._service.projects().regions()
+        self._clusters = regions.clusters()
+        self._jobs = regions.jobs()
+        self._operations = regions.operations()
+
+        self._executor = ThreadPoolExecutor(max_workers=kwargs.get('max_workers', 8))
+        self._local = local()
+
+    def _execute(self, request):
+        # httplib2.Http isn't thread-safe, so each worker thread authorizes its own
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = get_http(self._credentials, self._http_timeout)
+
+        return request.execute(http=http, num_retries=self._max_retries)
+
+    async def _execute_async(self, request):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._execute, request)
+
+    def close(self):
+        """
+        Shuts down the thread pool API calls are executed in, waiting for pending calls to complete.
+        """
+
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def get_operation(self, operation_name, fields=None):
+        """
+        Abstraction of projects().regions().operations().get() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.operations/get]
+
+        :param operation_name: Name of operation resource.
+        :param fields: Partial response mask, eg. 'name,done'. If None, the full resource is returned.
+        :return: Dictionary object representing operation resource.
+        """
+
+        return await self._execute_async(
+            self._operations.get(name=operation_name, fields=fields)
+        )
+
+    async def poll_operation_status(self, operation_resp, sleep_time=3, max_sleep_time=30, backoff_factor=2.0,
+                                    timeout=None, max_consecutive_failures=5, polling_strategy='exp'):
+        """
+        Polls operation till its *done* field is True. Refer to DataprocUtility.poll_operation_status().
+
+        :param operation_resp: Representation of operation resource.
+        :param sleep_time: Initial polling wait time.
+        :param max_sleep_time: Upper bound of polling wait time.
+        :param backoff_factor: Multiplier applied to polling wait time after each poll.
+        :param timeout: If set, seconds to poll for before raising TimeoutError.
+        :param max_consecutive_failures: Number of consecutive server errors or incomplete responses tolerated before raising.
+        :param polling_strategy: 'exp' grows the wait time by backoff_factor after each poll, 'fixed' always waits sleep_time, 'adaptive' waits a tenth of the time elapsed so far, bounded by sleep_time and max_sleep_time.
+        :return: OperationResponse object.
+        :raises: TimeoutError if timeout is exceeded, HttpError if non-retryable errors are encountered.
+        """
+
+        operation_name = operation_resp['name']
+
+        await _apoll(
+            lambda: self.get_operation(operation_name, fields=_OPERATION_POLL_FIELDS),
+            lambda resp: resp.get('done') is True,
+            operation_name,
+            _poll_delays(polling_strategy, sleep_time, backoff_factor, max_sleep_time),
+            timeout,
+            max_consecutive_failures
+        )
+
+        operation_resp = await self.get_operation(operation_name)
+
+        return OperationResponse(operation_resp)
+
+    async def wait_for_operations(self, operation_names, **kwargs):
+        """
+        Polls multiple operations concurrently on the event loop till all have completed. Accepts the same keyword arguments as poll_operation_status().
+
+        :param operation_names: Names of operation resources.
+        :type operation_names: list
+        :return: Dictionary of operation name to OperationResponse object.
+        """
+
+        operation_names = list(operation_names)
+
+        results = await asyncio.gather(
+            *[self.poll_operation_status({'name': name}, **kwargs) for name in operation_names]
+        )
+
+        return dict(zip(operation_names, results))
+
+    async def create_cluster(self, zone, cluster_name, wait_finish=True, sleep_time=3, **kwargs):
+        """
+        Abstraction of projects().regions().clusters().create() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.clusters/create]
+
+        Accepts the same keyword arguments as DataprocUtility.create_cluster().
+
+        :param zone: Dataproc zone.
+        :param cluster_name: Cluster name.
+        :param wait_finish: If set to True, operation will be polled till completion.
+        :param sleep_time: If wait_finish is set to True, sets initial polling wait time.
+        :return: Dictionary object or OperationResponse representing cluster resource.
+        """
+
+        cluster_resp = await self._execute_async(
+            self._clusters.create(
+                projectId=self.project_id,
+                region='global',
+                body=_build_cluster_body(self.project_id, zone, cluster_name, **kwargs)
+            )
+        )
 
         if wait_finish:
-            return self.poll_job_status(job_resp, sleep_time)
+            return await self.poll_operation_status(cluster_resp, sleep_time)
+        else:
+            return cluster_resp
+
+    async def delete_cluster(self, cluster_name, wait_finish=True, sleep_time=3):
+        """
+        Abstraction of projects().regions().clusters().delete() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.clusters/delete]
+
+        :param cluster_name: Cluster name.
+        :param wait_finish: If set to True, operation will be polled till completion.
+        :param sleep_time: If wait_finish is set to True, sets initial polling wait time.
+        :return: Dictionary object or OperationResponse representing cluster resource.
+        """
+
+        cluster_resp = await self._execute_async(
+            self._clusters.delete(
+                projectId=self.project_id,
+                region='global',
+                clusterName=cluster_name
+            )
+        )
+
+        if wait_finish:
+            return await self.poll_operation_status(cluster_resp, sleep_time)
+        else:
+            return cluster_resp
+
+    async def get_job(self, job_id, fields=None):
+        """
+        Abstraction of projects().regions().jobs().get() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.jobs/get]
+
+        :param job_id: Job Id.
+        :param fields: Partial response mask, eg. 'status'. If None, the full resource is returned.
+        :return: Dictionary object representing job resource.
+        """
+
+        return await self._execute_async(
+            self._jobs.get(
+                projectId=self.project_id,
+                region='global',
+                jobId=job_id,
+                fields=fields
+            )
+        )
+
+    async def poll_job_status(self, job_resp, sleep_time=3, max_sleep_time=30, backoff_factor=2.0,
+                              timeout=None, max_consecutive_failures=5, polling_strategy='exp'):
+        """
+        Polls job till it reaches a terminal state. Refer to DataprocUtility.poll_job_status().
+
+        :param job_resp: Representation of job resource.
+        :param sleep_time: Initial polling wait time.
+        :param max_sleep_time: Upper bound of polling wait time.
+        :param backoff_factor: Multiplier applied to polling wait time after each poll.
+        :param timeout: If set, seconds to poll for before raising TimeoutError.
+        :param max_consecutive_failures: Number of consecutive server errors or incomplete responses tolerated before raising.
+        :param polling_strategy: 'exp' grows the wait time by backoff_factor after each poll, 'fixed' always waits sleep_time, 'adaptive' waits a tenth of the time elapsed so far, bounded by sleep_time and max_sleep_time.
+        :return: JobResponse object.
+        :raises: TimeoutError if timeout is exceeded, HttpError if non-retryable errors are encountered.
+        """
+
+        job_id = job_resp['reference']['jobId']
+
+        await _apoll(
+            lambda: self.get_job(job_id, fields=_JOB_POLL_FIELDS),
+            lambda resp: resp['status']['state'] in _TERMINAL_JOB_STATES,
+            job_id,
+            _poll_delays(polling_strategy, sleep_time, backoff_factor, max_sleep_time),
+            timeout,
+            max_consecutive_failures
+        )
+
+        job_resp = await self.get_job(job_id)
+
+        return JobResponse(job_resp)
+
+    async def _submit_job(self, cluster_name, job_key, job_config, wait_finish, sleep_time):
+        job_resp = await self._execute_async(
+            self._jobs.submit(
+                projectId=self.project_id,
+                region='global',
+                body=_build_job_body(cluster_name, job_key, job_config)
+            )
+        )
+
+        if wait_finish:
+            return await self.poll_job_status(job_resp, sleep_time)
         else:
             return job_resp
+
+    async def submit_spark_job(self, cluster_name, main_class, wait_finish=True, sleep_time=5, **kwargs):
+        """
+        Abstraction of projects().regions().jobs().submit() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.jobs/submit]
+
+        Accepts the same keyword arguments as DataprocUtility.submit_spark_job().
+
+        :param cluster_name: The name of the cluster where the job will be submitted.
+        :param main_class: The name of the driver's main class.
+        :param wait_finish: If set to True, operation will be polled till completion.
+        :param sleep_time: If wait_finish is set to True, sets initial polling wait time.
+        :return: Dictionary object or JobResponse representing job resource.
+        """
+
+        return await self._submit_job(
+            cluster_name,
+            'sparkJob',
+            _build_spark_job(main_class, **kwargs),
+            wait_finish,
+            sleep_time
+        )
+
+    async def submit_pyspark_job(self, cluster_name, main_py_uri, wait_finish=True, sleep_time=5, **kwargs):
+        """
+        Abstraction of projects().regions().jobs().submit() method. [https://cloud.google.com/dataproc/docs/reference/rest/v1/projects.regions.jobs/submit]
+
+        Accepts the same keyword arguments as DataprocUtility.submit_pyspark_job().
+
+        :param cluster_name: The name of the cluster where the job will be submitted.
+        :param main_py_uri: The HCFS URI of the Python file to use as the driver.
+        :param wait_finish: If set to True, operation will be polled till completion.
+        :param sleep_time: If wait_finish is set to True, sets initial polling wait time.
+        :return: Dictionary object or JobResponse representing job resource.
+        """
+
+        return await self._submit_job(
+            cluster_name,
+            'pysparkJob',
+            _build_pyspark_job(main_py_uri, **kwargs),
+            wait_finish,
+            sleep_time
+        )
@@ -1,7 +1,15 @@
-from datetime import datetime
+from gwrappy.utils import rfc3339_to_datetime
+
+# job type fields of a job resource, only one of which is set
+_JOB_TYPES = (
+    'sparkJob', 'pysparkJob', 'hadoopJob', 'hiveJob', 'pigJob', 'sparkSqlJob',
+    'sparkRJob', 'prestoJob', 'trinoJob', 'flinkJob'
+)
 
 
 class OperationResponse:
+    __slots__ = ('resp', 'name', 'type', 'time_taken')
+
     def __init__(self, resp):
         """
         Wrapper for Dataproc Operation responses, mainly for calculating/parsing statistics into human readable formats for logging.
@@ -13,31 +21,22 @@ class OperationResponse:
         self.resp = resp
         self.name = resp['name']
         self.type = resp['metadata']['operationType']
+        self.time_taken = None
 
         self._parse_timing()
 
     def _parse_timing(self):
         try:
-            start_time = datetime.strptime(
-                self.resp['metadata']['statusHistory'][0]['stateStartTime'],
-                '%Y-%m-%dT%H:%M:%S.%fZ'
-            )
+            start_time = rfc3339_to_datetime(self.resp['metadata']['statusHistory'][0]['stateStartTime'])
 
-            end_time = datetime.strptime(
-                self.resp['metadata']['status']['stateStartTime'],
-                '%Y-%m-%dT%H:%M:%S.%fZ'
-            )
+            end_time = rfc3339_to_datetime(self.resp['metadata']['status']['stateStartTime'])
 
             time_taken = (end_time - start_time).total_seconds()
 
-            setattr(
-                self,
-                'time_taken',
-                dict(zip(
-                    ('m', 's'),
-                    divmod(time_taken, 60)
-                ))
-            )
+            self.time_taken = dict(zip(
+                ('m', 's'),
+                divmod(time_taken, 60)
+            ))
         except (IndexError, KeyError):
             pass
 
@@ -45,13 +44,15 @@ class OperationResponse:
         return '[Dataproc] %s Operation (%s)%s' % (
             self.type,
             self.name.split('/')[-1],
-            ' ({m:.0f} Minutes {s:.0f} Seconds)'.format(**getattr(self, 'time_taken')) if hasattr(self, 'time_taken') else ''
+            ' ({m:.0f} Minutes {s:.0f} Seconds)'.format(**self.time_taken) if self.time_taken is not None else ''
         )
 
     __str__ = __repr__
 
 
 class JobResponse:
+    __slots__ = ('resp', 'id', 'state', 'job_type', 'time_taken')
+
     def __init__(self, resp):
         """
         Wrapper for Dataproc Job responses, mainly for calculating/parsing statistics into human readable formats for logging.
@@ -63,44 +64,33 @@ class JobResponse:
         self.resp = resp
         self.id = '{projectId}:{jobId}'.format(**resp['reference'])
         self.state = resp['status']['state']
+        self.time_taken = None
 
-        self.job_type = set(tuple(resp.keys()))\
-            .intersection({'hadoopJob', 'sparkJob', 'pysparkJob', 'hiveJob', 'pigJob', 'sparkSqlJob'})\
-            .pop()
+        self.job_type = next((x for x in _JOB_TYPES if x in resp), None)
 
         self._parse_timing()
 
     def _parse_timing(self):
         try:
-            start_time = datetime.strptime(
-                self.resp['statusHistory'][0]['stateStartTime'],
-                '%Y-%m-%dT%H:%M:%S.%fZ'
-            )
+            start_time = rfc3339_to_datetime(self.resp['statusHistory'][0]['stateStartTime'])
 
-            end_time = datetime.strptime(
-                self.resp['status']['stateStartTime'],
-                '%Y-%m-%dT%H:%M:%S.%fZ'
-            )
+            end_time = rfc3339_to_datetime(self.resp['status']['stateStartTime'])
 
             time_taken = (end_time - start_time).total_seconds()
 
-            setattr(
-                self,
-                'time_taken',
-                dict(zip(
-                    ('m', 's'),
-                    divmod(time_taken, 60)
-                ))
-            )
+            self.time_taken = dict(zip(
+                ('m', 's'),
+                divmod(time_taken, 60)
+            ))
         except (IndexError, KeyError):
             pass
 
     def __repr__(self):
         return '[Dataproc] %s (%s) %s%s' % (
-            self.job_type[0].upper() + self.job_type[1:],
+            self.job_type[0].upper() + self.job_type[1:] if self.job_type is not None else 'Job',
             self.id,
             self.state,
-            ' ({m:.0f} Minutes {s:.0f} Seconds)'.format(**getattr(self, 'time_taken')) if hasattr(self, 'time_taken') else ''
+            ' ({m:.0f} Minutes {s:.0f} Seconds)'.format(**self.time_taken) if self.time_taken is not None else ''
         )
 
     __str__ = __repr__
@@ -1,12 +1,42 @@
 import os
 import io
-
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-from gwrappy.service import get_service
-from gwrappy.utils import iterate_list
+import random
+from copy import deepcopy
+from time import sleep
+from threading import Lock
+from queue import LifoQueue, Empty
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from contextlib import contextmanager
+
+import unicodecsv as csv
+
+from googleapiclient.http import MediaIoBaseDownload
+from gwrappy.service import get_service, get_credentials, get_http
+from gwrappy.utils import iterate_list, execute_batch, mapped_media, BackgroundWriter
 from gwrappy.errors import HttpError
 from gwrappy.drive.utils import DriveResponse
 
+from cachetools import TTLCache
+
+_DEFAULT_ABOUT_FIELDS = 'kind, storageQuota, user'
+_DEFAULT_FILE_FIELDS = 'name, id, mimeType, modifiedTime, size'
+_UPLOAD_FIELDS = 'id, name, size, modifiedTime, parents'
+
+
+@lru_cache(maxsize=64)
+def _join_fields(fields):
+    return ', '.join(fields)
+
+
+def _fields_str(fields, default):
+    if fields is None:
+        return default
+    elif isinstance(fields, list):
+        return _join_fields(tuple(fields))
+    else:
+        return fields
+
 
 class DriveUtility:
     def __init__(self, json_credentials_path, client_id, **kwargs):
@@ -20,36 +50,105 @@ class DriveUtility:
         :type max_retries: integer
         :keyword chunksize: Upload/Download chunk size
         :type chunksize: integer
+        :keyword file_id_cache_ttl: Seconds file ids resolved by upload_file(use_cache=True) are remembered for, skipping the existence check on repeated uploads to the same name.
+        :type file_id_cache_ttl: integer
+        :keyword file_cache_ttl: Seconds file resources returned by get_file() and get_files() are cached for, when requested with use_cache=True.
+        :type file_cache_ttl: integer
+        :keyword about_cache_ttl: Seconds account info returned by get_account_info() is cached for, when requested with use_cache=True.
+        :type about_cache_ttl: integer
+        :keyword http: Authorized httplib2.Http object, eg. from gwrappy.service.get_http(). Allows connections to be shared across Utility objects.
+        :keyword http_timeout: Socket timeout in seconds for API calls.
+        :type http_timeout: integer
         """
+        if 'http' in kwargs:
+            # credentials are unknown for a shared http, so parallel downloads fall back to the serial path
+            self._credentials = None
+        else:
+            self._credentials = get_credentials('drive', json_credentials_path=json_credentials_path, client_id=client_id, **kwargs)
+            kwargs['http'] = get_http(self._credentials, timeout=kwargs.get('http_timeout', None))
+
         self._service = get_service('drive', json_credentials_path=json_credentials_path, client_id=client_id, **kwargs)
+        self._http_timeout = kwargs.get('http_timeout', None)
+
+        # resource objects are reused across calls rather than rebuilt from the service each time
+        self._about = self._service.about()
+        self._files = self._service.files()
+
+        # httplib2.Http isn't thread-safe, so each concurrent worker borrows a service with its own authorized Http
+        # they're kept across calls so their connections and TLS sessions are reused rather than re-established
+        self._worker_services = LifoQueue()
 
         self._max_retries = kwargs.get('max_retries', 3)
 
         # Number of bytes to send/receive in each request.
-        self._chunksize = kwargs.get('chunksize', 2 * 1024 * 1024)
+        self._chunksize = kwargs.get('chunksize', 16 * 1024 * 1024)
+
+        # (name, parents) to file id of previously uploaded files
+        self._file_id_cache = TTLCache(maxsize=256, ttl=kwargs.get('file_id_cache_ttl', 60))
+        self._file_id_lock = Lock()
+
+        # (file id, fields) to file resource
+        self._file_cache = TTLCache(maxsize=1024, ttl=kwargs.get('file_cache_ttl', 60))
+        # fields to About resource, which rarely changes
+        self._about_cache = TTLCache(maxsize=8, ttl=kwargs.get('about_cache_ttl', 300))
+        self._file_cache_lock = Lock()
+
+    def clear_cache(self):
+        """
+        Removes all cached account info, file resources and file ids.
+        """
+
+        with self._file_cache_lock:
+            self._file_cache.clear()
+            self._about_cache.clear()
 
-    def get_account_info(self, fields=None):
+        with self._file_id_lock:
+            self._file_id_cache.clear()
+
+    def _cache_get(self, cache, key):
+        # copies are stored and returned so callers mutating a resource don't alter the cache
+        with self._file_cache_lock:
+            resp = cache.get(key)
+
+        return deepcopy(resp) if resp is not None else None
+
+    def _cache_set(self, cache, key, value, use_cache):
+        # without use_cache, only resources which are already cached are refreshed
+        with self._file_cache_lock:
+            if use_cache or key in cache:
+                cache[key] = deepcopy(value)
+
+    def _invalidate_file(self, file_id):
+        with self._file_cache_lock:
+            for key in [x for x in self._file_cache.keys() if x[0] == file_id]:
+                self._file_cache.pop(key, None)
+
+    def get_account_info(self, fields=None, use_cache=False):
         """
         Abstraction of about().get() method. [https://developers.google.com/drive/v3/reference/about/get]
 
         :param fields: Available properties can be found here: https://developers.google.com/drive/v3/reference/about
         :type fields: list or ", " delimited string
+        :param use_cache: If True, returns the cached account info if available, so storage quota may be stale. If False, always queries the API, refreshing the cached account info if any.
+        :type use_cache: boolean
         :return: Dictionary object representation of About resource.
         """
-        if fields is None:
-            fields = [
-                'kind',
-                'storageQuota',
-                'user'
-            ]
+        fields = _fields_str(fields, _DEFAULT_ABOUT_FIELDS)
 
-        if isinstance(fields, list):
-            fields = ', '.join(fields)
+        if use_cache:
+            resp = self._cache_get(self._about_cache, fields)
 
-        return self._service.about().get(
+            if resp is not None:
+                return resp
+
+        resp = self._about.get(
             fields=fields
         ).execute(num_retries=self._max_retries)
 
+        self._cache_set(self._about_cache, fields, resp, use_cache)
+
+        return resp
+
     def list_files(self, max_results=None, **kwargs):
         """
         Abstraction of files().list() method with inbuilt iteration functionality. [https://developers.google.com/drive/v3/reference/files/list]
@@ -67,7 +166,7 @@ class DriveUtility:
             order_by = ','.join(order_by)
 
         return iterate_list(
-            self._service.files(),
+            self._files,
             'files',
             max_results,
             self._max_retries,
@@ -77,7 +176,7 @@ class DriveUtility:
             spaces=kwargs.get('spaces', None)
         )
 
-    def get_file(self, file_id, fields=None):
+    def get_file(self, file_id, fields=None, use_cache=False):
         """
         Get file metadata.
 
@@ -85,29 +184,113 @@ class DriveUtility:
         :type file_id: string
         :param fields: Available properties can be found here: https://developers.google.com/drive/v3/reference/about
         :type fields: list or ", " delimited string
+        :param use_cache: If True, returns the cached file resource if available. If False, always queries the API, refreshing the cached file resource if any.
+        :type use_cache: boolean
         :return: Dictionary object representing file resource.
         """
 
-        if fields is None:
-            fields = [
-                'name',
-                'id',
-                'mimeType',
-                'modifiedTime',
-                'size'
-            ]
+        fields = _fields_str(fields, _DEFAULT_FILE_FIELDS)
 
-        if isinstance(fields, list):
-            fields = ', '.join(fields)
+        if use_cache:
+            resp = self._cache_get(self._file_cache, (file_id, fields))
 
-        resp = self._service.files().get(
+            if resp is not None:
+                return resp
+
+        resp = self._files.get(
             fileId=file_id,
             fields=fields
         ).execute(num_retries=self._max_retries)
 
+        self._cache_set(self._file_cache, (file_id, fields), resp, use_cache)
+
+        return resp
+
+    def get_files(self, file_ids, fields=None, use_cache=False):
+        """
+        Get metadata of multiple files, batched into as few HTTP requests as possible.
+
+        :param file_ids: Unique file ids. Check on UI or by list_files().
+        :type file_ids: list
+        :param fields: Available properties can be found here: https://developers.google.com/drive/v3/reference/about
+        :type fields: list or ", " delimited string
+        :param use_cache: If True, returns the cached file resources if available. If False, always queries the API, refreshing the cached file resources if any.
+        :type use_cache: boolean
+        :return: Dictionary of file id to dictionary object representing file resource.
+        :raises: HttpError if any request fails.
+        """
+
+        fields = _fields_str(fields, _DEFAULT_FILE_FIELDS)
+
+        resp = {}
+
+        if use_cache:
+            for file_id in file_ids:
+                file_resp = self._cache_get(self._file_cache, (file_id, fields))
+                if file_resp is not None:
+                    resp[file_id] = file_resp
+
+        # only cache misses are requested, Drive accepts at most 100 calls per batch request
+        resp.update(execute_batch(
+            self._service,
+            dict((file_id, self._files.get(fileId=file_id, fields=fields)) for file_id in file_ids if file_id not in resp),
+            batch_size=100,
+            max_retries=self._max_retries
+        ))
+
+        for file_id, file_resp in resp.items():
+            if isinstance(file_resp, Exception):
+                raise file_resp
+
+        for file_id, file_resp in resp.items():
+            self._cache_set(self._file_cache, (file_id, fields), file_resp, use_cache)
+
         return resp
 
-    def download_file(self, file_id, write_path, page_num=None, output_type=None):
+    @contextmanager
+    def _worker_service(self):
+        try:
+            service = self._worker_services.get_nowait()
+        except Empty:
+            service = get_service('drive', http=get_http(self._credentials, timeout=self._http_timeout))
+
+        try:
+            yield service
+        finally:
+            self._worker_services.put(service)
+
+    def _download_range(self, media_url, fd, start, end):
+        for retry_num in range(self._max_retries + 1):
+            if retry_num > 0:
+                sleep(random.random() * (2 ** retry_num))
+
+            with self._worker_service() as service:
+                resp, content = service._http.request(media_url, headers={'Range': 'bytes=%i-%i' % (start, end)})
+
+            if resp.status in (200, 206):
+                # ranges don't overlap, so workers write to the shared descriptor without locking
+                os.pwrite(fd, content, start)
+                return
+            elif resp.status < 500 and resp.status != 429:
+                break
+
+        raise HttpError(resp, content, uri=media_url)
+
+    def _download_parallel(self, media_url, write_path, size, parallel_workers):
+        with io.open(write_path, 'wb') as write_file:
+            write_file.truncate(size)
+            fd = write_file.fileno()
+
+            with ThreadPoolExecutor(max_workers=parallel_workers) as executor:
+                futures = [
+                    executor.submit(self._download_range, media_url, fd, start, min(start + self._chunksize, size) - 1)
+                    for start in range(0, size, self._chunksize)
+                ]
+
+                for future in futures:
+                    future.result()
+
+    def download_file(self, file_id, write_path, page_num=None, output_type=None, parallel_workers=1):
         """
         Downloads object.
 
@@ -119,13 +302,16 @@ class DriveUtility:
         :type page_num: integer
         :param output_type: Only applicable to Google Sheets. Can be directly downloaded as list or Pandas dataframe.
         :type output_type: string. 'list' or 'dataframe'
+        :param parallel_workers: Number of chunks downloaded concurrently with Range requests. Only applicable to files larger than chunksize, falls back to a serial download if the http object was passed in.
+        :type parallel_workers: integer
         :returns: If Google Sheet and output_type specified: result in selected type, DriveResponse object. Else DriveResponse object.
         :raises: HttpError if non-retryable errors are encountered.
         """
 
         drive_resp = DriveResponse('downloaded')
 
-        file_metadata = self.get_file(file_id)
+        # size has to be current for ranged downloads
+        file_metadata = self.get_file(file_id, use_cache=False)
 
         if file_metadata['mimeType'] == 'application/vnd.google-apps.spreadsheet':
             assert page_num is not None
@@ -139,13 +325,16 @@ class DriveUtility:
 
                     with io.BytesIO(content) as file_buffer:
                         if output_type == 'list':
-                            import unicodecsv as csv
-
                             drive_resp.load_resp(file_metadata, True)
                             return list(csv.reader(file_buffer)), drive_resp
 
                         elif output_type == 'dataframe':
-                            import pandas as pd
+                            # pandas is optional and slow to import, so it's only imported when needed
+                            try:
+                                import pandas as pd
+                            except ImportError:
+                                raise ImportError('pandas is required for output_type=\'dataframe\'')
+
                             pd.set_option('display.expand_frame_repr', False)
 
                             drive_resp.load_resp(file_metadata, True)
@@ -157,14 +346,21 @@ class DriveUtility:
                 raise HttpError(resp, content)
 
         else:
-            req = self._service.files().get_media(fileId=file_id)
+            req = self._files.get_media(fileId=file_id)
+
+            size = int(file_metadata.get('size', 0))
 
-            with io.open(write_path, 'wb') as write_file:
-                downloader = MediaIoBaseDownload(write_file, req)
+            if parallel_workers > 1 and self._credentials is not None and hasattr(os, 'pwrite') and size > self._chunksize:
+                self._download_parallel(req.uri, write_path, size, parallel_workers)
+
+            else:
+                # chunks are written to disk in a background thread while the next chunk is downloaded
+                with io.open(write_path, 'wb') as write_file, BackgroundWriter(write_file) as writer:
+                    downloader = MediaIoBaseDownload(writer, req, chunksize=self._chunksize)
 
-                done = False
-                while done is False:
-                    status, done = downloader.next_chunk(num_retries=self._max_retries)
+                    done = False
+                    while done is False:
+                        status, done = downloader.next_chunk(num_retries=self._max_retries)
 
         drive_resp.load_resp(
             file_metadata,
@@ -172,7 +368,7 @@ class DriveUtility:
         )
         return drive_resp
 
-    def upload_file(self, read_path, overwrite_existing=True, **kwargs):
+    def upload_file(self, read_path, overwrite_existing=True, file_id=None, use_cache=False, **kwargs):
         """
         Creates file if it doesn't exist, updates if it does.
 
@@ -180,52 +376,122 @@ class DriveUtility:
         :type read_path: string
         :param overwrite_existing: Safety flag, would raise ValueError if object exists and overwrite_existing=False
         :type overwrite_existing: boolean
+        :param file_id: Unique file id of the file to update. If set, the existence check is skipped.
+        :type file_id: string
+        :param use_cache: If True, reuses the file id resolved by a previous upload to the same name and parents, skipping the existence check. Only safe if no one else trashes, moves or replaces the file in the meantime.
+        :type use_cache: boolean
         :param kwargs: Key-Value pairs of Request Body params. Reference here: https://developers.google.com/drive/v3/reference/files
         :return: DriveResponse object.
         """
+        return self._upload_file(self._service, read_path, overwrite_existing, file_id, use_cache, **kwargs)
+
+    def upload_files(self, read_paths, overwrite_existing=True, parallel_workers=4, use_cache=False, **kwargs):
+        """
+        Uploads multiple files concurrently, each over its own connection. Falls back to uploading one at a time if the http object was passed in.
+
+        :param read_paths: Local paths of objects to upload.
+        :type read_paths: list
+        :param overwrite_existing: Safety flag, would raise ValueError if any object exists and overwrite_existing=False
+        :type overwrite_existing: boolean
+        :param parallel_workers: Maximum number of files uploaded at once.
+        :type parallel_workers: integer
+        :param use_cache: If True, reuses file ids resolved by previous uploads, as in upload_file().
+        :type use_cache: boolean
+        :param kwargs: Key-Value pairs of Request Body params shared by every file, eg. parents. Reference here: https://developers.google.com/drive/v3/reference/files
+        :return: List of DriveResponse objects, in the same order as read_paths.
+        """
+
+        if self._credentials is None or parallel_workers <= 1:
+            return [self.upload_file(read_path, overwrite_existing, use_cache=use_cache, **kwargs) for read_path in read_paths]
+
+        def _upload(read_path):
+            with self._worker_service() as service:
+                return self._upload_file(service, read_path, overwrite_existing, None, use_cache, **kwargs)
+
+        with ThreadPoolExecutor(max_workers=parallel_workers) as executor:
+            return list(executor.map(_upload, read_paths))
+
+    def _upload_file(self, service, read_path, overwrite_existing, file_id, use_cache, **kwargs):
         drive_resp = DriveResponse('uploaded')
 
-        file_name = os.path.basename(read_path)
+        file_name = kwargs['name'] if 'name' in kwargs else os.path.basename(read_path)
 
         request_body = {
-            'name': kwargs['name'] if 'name' in kwargs else file_name
+            'name': file_name
         }
 
-        # check for existing file
-        if 'name' in kwargs:
-            q = 'name="%s"' % kwargs['name']
-        else:
-            q = 'name="%s"' % file_name
-
         if 'parents' in kwargs:
             assert isinstance(kwargs['parents'], str)
-            q += ' and "%s" in parents' % kwargs['parents']
 
-        existing_files = list(self.list_files(q=q))
-        assert len(existing_files) <= 1, 'More than one file matches %s' % file_name
+        cache_key = (file_name, kwargs.get('parents', None))
 
-        media = MediaFileUpload(read_path, chunksize=self._chunksize, resumable=True)
+        from_cache = False
+
+        if file_id is None and use_cache:
+            with self._file_id_lock:
+                file_id = self._file_id_cache.get(cache_key)
+
+            from_cache = file_id is not None
+
+        if file_id is None:
+            # check for existing file
+            q = 'name="%s"' % file_name
 
-        if len(existing_files) == 0:
             if 'parents' in kwargs:
-                request_body['parents'] = [kwargs['parents']]
-
-            resp = self._service.files().create(
-                media_body=media,
-                body=request_body,
-                fields='id, name, size, modifiedTime, parents'
-            ).execute(num_retries=self._max_retries)
-
-        elif overwrite_existing:
-            resp = self._service.files().update(
-                fileId=existing_files[0]['id'],
-                media_body=media,
-                body=request_body,
-                fields='id, name, size, modifiedTime, parents'
-            ).execute(num_retries=self._max_retries)
+                q += ' and "%s" in parents' % kwargs['parents']
+
+            # two results are enough to detect ambiguous names
+            existing_files = list(iterate_list(
+                service.files(),
+                'files',
+                max_results=2,
+                max_retries=self._max_retries,
+                q=q,
+                fields='nextPageToken, files(id)'
+            ))
+            assert len(existing_files) <= 1, 'More than one file matches %s' % file_name
+
+            if len(existing_files) == 1:
+                file_id = existing_files[0]['id']
+
+        with mapped_media(read_path, self._chunksize) as media:
+            if file_id is None:
+                if 'parents' in kwargs:
+                    request_body['parents'] = [kwargs['parents']]
+
+                resp = service.files().create(
+                    media_body=media,
+                    body=request_body,
+                    fields=_UPLOAD_FIELDS
+                ).execute(num_retries=self._max_retries)
+
+            elif overwrite_existing:
+                try:
+                    resp = service.files().update(
+                        fileId=file_id,
+                        media_body=media,
+                        body=request_body,
+                        fields=_UPLOAD_FIELDS
+                    ).execute(num_retries=self._max_retries)
+                except HttpError as e:
+                    if e.resp.status != 404 or not from_cache:
+                        raise
+
+                    # cached file was deleted since, look it up again
+                    with self._file_id_lock:
+                        self._file_id_cache.pop(cache_key, None)
+
+                    return self._upload_file(service, read_path, overwrite_existing, None, use_cache, **kwargs)
 
-        else:
-            raise ValueError('Existing file found, set overwrite=True to overwrite file')
+            else:
+                raise ValueError('Existing file found, set overwrite=True to overwrite file')
+
+        # without use_cache, only file ids which are already cached are refreshed
+        with self._file_id_lock:
+            if use_cache or cache_key in self._file_id_cache:
+                self._file_id_cache[cache_key] = resp['id']
+
+        self._invalidate_file(resp['id'])
 
         drive_resp.load_resp(
             resp,
@@ -1,9 +1,13 @@
 from datetime import datetime
+from time import monotonic
 from pytz import UTC
-import humanize
+
+from gwrappy.utils import rfc3339_to_datetime, naturalsize
 
 
 class DriveResponse:
+    __slots__ = ('description', 'start_time', 'resp', 'time_taken', '_start_monotonic')
+
     def __init__(self, description):
         """
         Wrapper for Drive upload and download responses, mainly for calculating/parsing job statistics into human readable formats for logging.
@@ -12,10 +16,13 @@ class DriveResponse:
         """
 
         self.description = description.strip().title()
+        self.resp = None
+        self.time_taken = None
         self.start()
 
     def start(self):
-        setattr(self, 'start_time', datetime.now(UTC))
+        self.start_time = datetime.now(UTC)
+        self._start_monotonic = monotonic()
 
     def load_resp(self, resp, is_download=False):
         """
@@ -28,30 +35,30 @@ class DriveResponse:
         """
 
         assert isinstance(resp, dict)
-        setattr(self, 'resp', resp)
-
-        try:
-            setattr(self, 'size', humanize.naturalsize(int(resp['size'])))
-        except KeyError:
-            pass
+        self.resp = resp
 
         if is_download:
-            updated_at = datetime.now(UTC)
+            elapsed = int(monotonic() - self._start_monotonic)
         else:
-            updated_at = UTC.localize(datetime.strptime(resp['modifiedTime'], '%Y-%m-%dT%H:%M:%S.%fZ'))
+            updated_at = rfc3339_to_datetime(resp['modifiedTime'])
+            elapsed = (updated_at - self.start_time).seconds if updated_at > self.start_time else 0
+
+        self.time_taken = dict(zip(('m', 's'), divmod(elapsed, 60)))
 
-        setattr(self, 'time_taken', dict(zip(
-            ('m', 's'),
-            divmod((updated_at - getattr(self, 'start_time')).seconds if updated_at > getattr(self, 'start_time') else 0, 60)
-        )))
+    @property
+    def size(self):
+        # only formatted when inspected, eg. for logging
+        if self.resp is None or 'size' not in self.resp:
+            return None
+        return naturalsize(int(self.resp['size']))
 
     def __repr__(self):
         return '[Drive] %s %s [%s] %s(%s)' % (
             self.description,
-            getattr(self, 'resp').get('name', None),
-            getattr(self, 'resp').get('id', None),
-            '%s ' % getattr(self, 'size') if hasattr(self, 'size') else '',
-            '{m} Minutes {s} Seconds'.format(**getattr(self, 'time_taken'))
+            self.resp.get('name', None),
+            self.resp.get('id', None),
+            '%s ' % self.size if self.size is not None else '',
+            '{m} Minutes {s} Seconds'.format(**self.time_taken)
         )
 
     __str__ = __repr__
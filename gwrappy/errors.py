@@ -1 +1,8 @@
 from googleapiclient.errors import *
+
+
+class PollingCancelled(Exception):
+    """
+    Raised by a poll that was cancelled before the polled resource completed, eg. via DataprocUtility.cancel_polls().
+    """
+    pass
@@ -1,8 +1,90 @@
 from gwrappy.service import get_service
-from gwrappy.utils import iterate_list, timestamp_to_datetime
-from gwrappy.gmail.utils import create_message
+from gwrappy.utils import iterate_list, execute_batch, timestamp_to_datetime
+from gwrappy.gmail.utils import create_message, build_message, write_message
 
-import base64
+from googleapiclient.http import MediaIoBaseUpload
+
+import binascii
+from copy import deepcopy
+from threading import Lock
+from contextlib import contextmanager
+
+from cachetools import TTLCache
+
+# url-safe base64 alphabet to the standard one understood by binascii
+_B64_TRANS = bytes.maketrans(b'-_', b'+/')
+
+
+def _decode_attachment_data(data):
+    if not isinstance(data, bytes):
+        data = data.encode('ascii')
+
+    data = data.translate(_B64_TRANS)
+
+    try:
+        return binascii.a2b_base64(data)
+    except binascii.Error:
+        # tolerate missing padding
+        return binascii.a2b_base64(data + b'=' * (-len(data) % 4))
+
+
+# partial response of messages fetched by list_messages(metadata_only=True)
+_METADATA_FIELDS = 'id, threadId, labelIds, snippet, internalDate, payload/headers'
+_DEFAULT_METADATA_HEADERS = ('From', 'To', 'Subject', 'Date')
+
+
+def _get_params(format, fields=None, metadata_headers=None):
+    params = {'format': format}
+
+    if fields is not None:
+        params['fields'] = fields
+
+    if metadata_headers is not None:
+        # repeated query parameters have to be lists
+        params['metadataHeaders'] = list(metadata_headers)
+
+    return params
+
+
+def _cache_key(resource_type, id, params):
+    metadata_headers = params.get('metadataHeaders')
+    return (resource_type, id, params['format'], params.get('fields'), tuple(metadata_headers) if metadata_headers else None)
+
+
+# resumable upload chunks have to be multiples of 256KB
+_MESSAGE_CHUNKSIZE = 1024 * 1024
+
+
+@contextmanager
+def _message_request(sender, to, subject, message_text, attachment_file_paths):
+    # yields kwargs of drafts().create() and messages().send() for the message
+    if attachment_file_paths is None:
+        yield {'body': create_message(sender, to, subject, message_text)}
+
+    else:
+        # messages with attachments are uploaded as message/rfc822 media from a spooled file,
+        # rather than base64 encoded as a whole into the request body
+        message_file = write_message(build_message(sender, to, subject, message_text, attachment_file_paths))
+
+        try:
+            yield {'media_body': MediaIoBaseUpload(message_file, 'message/rfc822', chunksize=_MESSAGE_CHUNKSIZE, resumable=True)}
+        finally:
+            message_file.close()
+
+
+def _fetch_in_batches(ids, get_batch, batch_size=50):
+    # resources are yielded as each batch request completes instead of after all of them
+    batch = []
+
+    for x in ids:
+        batch.append(x)
+
+        if len(batch) == batch_size:
+            yield from get_batch(batch)
+            batch = []
+
+    if batch:
+        yield from get_batch(batch)
 
 
 class GmailUtility:
@@ -15,22 +97,75 @@ class GmailUtility:
         :param client_id: Credentials are stored as a key-value pair per client_id to facilitate multiple clients using the same credentials file. For simplicity, using one's email address is sufficient.
         :keyword max_retries: Argument specified with each API call to natively handle retryable errors.
         :type max_retries: integer
+        :keyword http: Authorized httplib2.Http object, eg. from gwrappy.service.get_http(). Allows connections to be shared across Utility objects.
+        :keyword http_timeout: Socket timeout in seconds for API calls.
+        :type http_timeout: integer
+        :keyword cache_ttl: Seconds profile, message and draft resources are cached for, when requested with use_cache=True.
+        :type cache_ttl: integer
         """
 
         self._service = get_service('gmail', json_credentials_path=json_credentials_path, client_id=client_id, **kwargs)
 
+        # resource objects are reused across calls rather than rebuilt from the service each time
+        self._users = self._service.users()
+        self._messages = self._users.messages()
+        self._drafts = self._users.drafts()
+        self._attachments = self._messages.attachments()
+
         self._max_retries = kwargs.get('max_retries', 3)
 
-    def get_profile(self):
+        # keyed by (resource type, id, format, fields, metadata headers)
+        self._cache = TTLCache(maxsize=1024, ttl=kwargs.get('cache_ttl', 60))
+        self._cache_lock = Lock()
+
+    def _cache_get(self, key):
+        # copies are stored and returned so callers mutating a resource don't alter the cache
+        with self._cache_lock:
+            resp = self._cache.get(key)
+
+        return deepcopy(resp) if resp is not None else None
+
+    def _cache_set(self, key, value, use_cache):
+        # without use_cache, only resources which are already cached are refreshed
+        with self._cache_lock:
+            if use_cache or key in self._cache:
+                self._cache[key] = deepcopy(value)
+
+    def _get_cached(self, key, req, use_cache):
+        if use_cache:
+            resp = self._cache_get(key)
+            if resp is not None:
+                return resp
+
+        resp = req.execute(num_retries=self._max_retries)
+        self._cache_set(key, resp, use_cache)
+
+        return resp
+
+    def clear_cache(self):
+        """
+        Removes all cached profile, message and draft resources.
+        """
+
+        with self._cache_lock:
+            self._cache.clear()
+
+    def get_profile(self, use_cache=False):
         """
         Abstraction of users().getProfile() method. [https://developers.google.com/gmail/api/v1/reference/users/getProfile]
 
+        :param use_cache: If True, returns the cached profile if available. If False, always queries the API, refreshing the cached profile if any.
+        :type use_cache: boolean
         :return: Dictionary object representing authenticated profile.
         """
 
-        return self._service.users().getProfile(userId='me').execute(num_retries=self._max_retries)
+        return self._get_cached(
+            ('profile', 'me', None),
+            self._users.getProfile(userId='me'),
+            use_cache
+        )
 
-    def get_message(self, id, format='full'):
+    def get_message(self, id, format='full', use_cache=False, fields=None, metadata_headers=None):
         """
         Abstraction of users().messages().get() method. [https://developers.google.com/gmail/api/v1/reference/users/messages/get]
 
@@ -38,16 +173,24 @@ class GmailUtility:
         :type id: string
         :keyword format: Acceptable values are 'full', 'metadata', 'minimal', 'raw'
         :type format: string
+        :param use_cache: If True, returns the cached message resource if available. If False, always queries the API, refreshing the cached message resource if any.
+        :type use_cache: boolean
+        :param fields: Partial response selector, eg. 'id, internalDate, payload/headers'. If None, the whole resource is returned.
+        :type fields: string
+        :param metadata_headers: Only applicable to format='metadata'. Headers to include, eg. ['From', 'Subject', 'Date'].
+        :type metadata_headers: list
         :return: Dictionary object representing message resource.
         """
 
-        return self._service.users().messages().get(
-            id=id,
-            userId='me',
-            format=format
-        ).execute(num_retries=self._max_retries)
+        params = _get_params(format, fields, metadata_headers)
 
-    def get_draft(self, id, format='full'):
+        return self._get_cached(
+            _cache_key('message', id, params),
+            self._messages.get(id=id, userId='me', **params),
+            use_cache
+        )
+
+    def get_draft(self, id, format='full', use_cache=False, fields=None):
         """
         Abstraction of users().drafts().get() method. [https://developers.google.com/gmail/api/v1/reference/users/drafts/get]
 
@@ -55,31 +198,112 @@ class GmailUtility:
         :type id: string
         :keyword format: Acceptable values are 'full', 'metadata', 'minimal', 'raw'
         :type format: string
+        :param use_cache: If True, returns the cached draft resource if available. If False, always queries the API, refreshing the cached draft resource if any.
+        :type use_cache: boolean
+        :param fields: Partial response selector, eg. 'id, message/payload/headers'. If None, the whole resource is returned.
+        :type fields: string
         :return: Dictionary object representing draft resource.
         """
 
-        return self._service.users().drafts().get(
-            id=id,
-            userId='me',
-            format=format
-        ).execute(num_retries=self._max_retries)
+        params = _get_params(format, fields)
+
+        return self._get_cached(
+            _cache_key('draft', id, params),
+            self._drafts.get(id=id, userId='me', **params),
+            use_cache
+        )
+
+    def _batch_get(self, ids, resource, resource_type, params, use_cache):
+        ids = list(ids)
+        resp = {}
+
+        if use_cache:
+            for x in ids:
+                cached_resp = self._cache_get(_cache_key(resource_type, x, params))
+                if cached_resp is not None:
+                    resp[x] = cached_resp
+
+        # only cache misses are requested, Gmail rate limits batches larger than 50 calls
+        resp.update(execute_batch(
+            self._service,
+            dict((x, resource.get(id=x, userId='me', **params)) for x in ids if x not in resp),
+            batch_size=50,
+            max_retries=self._max_retries
+        ))
+
+        for x in ids:
+            if isinstance(resp[x], Exception):
+                raise resp[x]
+
+            self._cache_set(_cache_key(resource_type, x, params), resp[x], use_cache)
 
-    def list_messages(self, max_results=None, full_messages=True, **kwargs):
+        return [resp[x] for x in ids]
+
+    def get_messages(self, ids, format='full', use_cache=False, fields=None, metadata_headers=None):
+        """
+        Get multiple messages, batched into as few HTTP requests as possible.
+
+        :argument ids: Unique message ids.
+        :type ids: list
+        :keyword format: Acceptable values are 'full', 'metadata', 'minimal', 'raw'
+        :type format: string
+        :param use_cache: If True, returns the cached message resources if available. If False, always queries the API, refreshing the cached message resources if any.
+        :type use_cache: boolean
+        :param fields: Partial response selector, eg. 'id, internalDate, payload/headers'. If None, whole resources are returned.
+        :type fields: string
+        :param metadata_headers: Only applicable to format='metadata'. Headers to include, eg. ['From', 'Subject', 'Date'].
+        :type metadata_headers: list
+        :return: List of dictionary objects representing message resources, in the same order as ids.
+        :raises: HttpError if any request fails.
+        """
+
+        return self._batch_get(
+            ids,
+            self._messages,
+            'message',
+            _get_params(format, fields, metadata_headers),
+            use_cache
+        )
+
+    def get_drafts(self, ids, format='full', use_cache=False, fields=None):
+        """
+        Get multiple drafts, batched into as few HTTP requests as possible.
+
+        :argument ids: Unique draft ids.
+        :type ids: list
+        :keyword format: Acceptable values are 'full', 'metadata', 'minimal', 'raw'
+        :type format: string
+        :param use_cache: If True, returns the cached draft resources if available. If False, always queries the API, refreshing the cached draft resources if any.
+        :type use_cache: boolean
+        :param fields: Partial response selector, eg. 'id, message/payload/headers'. If None, whole resources are returned.
+        :type fields: string
+        :return: List of dictionary objects representing draft resources, in the same order as ids.
+        :raises: HttpError if any request fails.
+        """
+
+        return self._batch_get(ids, self._drafts, 'draft', _get_params(format, fields), use_cache)
+
+    def list_messages(self, max_results=None, full_messages=True, metadata_only=False, **kwargs):
         """
         Abstraction of users().messages().list() method with inbuilt iteration functionality. [https://developers.google.com/gmail/api/v1/reference/users/messages/list]
 
         :param max_results: If None, all results are iterated over and returned.
         :type max_results: integer
-        :param full_messages: Convenience toggle to call self.get_message() for each message returned.
+        :param full_messages: Convenience toggle to fetch each message returned with self.get_messages().
         :type full_messages: boolean
+        :param metadata_only: Only applicable if full_messages=True. Fetches the id, labels, date and *metadata_headers* of each message instead of the whole message.
+        :type metadata_only: boolean
+        :keyword metadata_headers: Only applicable if metadata_only=True. Headers to include, defaults to From, To, Subject and Date.
+        :type metadata_headers: list
         :keyword q: A query for filtering the file results. Can be generated from gwrappy.gmail.utils.generate_q
-        :return: List of dictionary objects representing message resources.
+        :return: Iterator over dictionary objects representing message resources. If full_messages=True, messages are fetched 50 at a time as the iterator is consumed.
         """
 
+        metadata_headers = kwargs.pop('metadata_headers', _DEFAULT_METADATA_HEADERS)
         kwargs['userId'] = 'me'
 
         results = iterate_list(
-            self._service.users().messages(),
+            self._messages,
             'messages',
             max_results,
             self._max_retries,
@@ -87,7 +311,17 @@ class GmailUtility:
          )
 
         if full_messages:
-            results = [self.get_message(x['id']) for x in results]
+            if metadata_only:
+                get_batch = lambda ids: self.get_messages(
+                    ids,
+                    format='metadata',
+                    fields=_METADATA_FIELDS,
+                    metadata_headers=metadata_headers
+                )
+            else:
+                get_batch = self.get_messages
+
+            results = _fetch_in_batches((x['id'] for x in results), get_batch)
 
         return results
 
@@ -97,16 +331,16 @@ class GmailUtility:
 
         :param max_results: If None, all results are iterated over and returned.
         :type max_results: integer
-        :param full_messages: Convenience toggle to call self.get_draft() for each message returned.
+        :param full_messages: Convenience toggle to fetch each draft returned with self.get_drafts().
         :type full_messages: boolean
         :keyword q: A query for filtering the file results. Can be generated from gwrappy.gmail.utils.generate_q
-        :return: List of dictionary objects representing draft resources.
+        :return: Iterator over dictionary objects representing draft resources. If full_messages=True, drafts are fetched 50 at a time as the iterator is consumed.
         """
 
         kwargs['userId'] = 'me'
 
         results = iterate_list(
-            self._service.users().drafts(),
+            self._drafts,
             'drafts',
             max_results,
             self._max_retries,
@@ -114,7 +348,7 @@ class GmailUtility:
         )
 
         if full_messages:
-            results = [self.get_draft(x['id']) for x in results]
+            results = _fetch_in_batches((x['id'] for x in results), self.get_drafts)
 
         return results
 
@@ -134,11 +368,14 @@ class GmailUtility:
         :return: API response.
         """
 
-        message = {'message': create_message(sender, to, subject, message_text, attachment_file_paths)}
-        resp = self._service.users().drafts().create(
-            userId='me',
-            body=message
-        ).execute(num_retries=self._max_retries)
+        with _message_request(sender, to, subject, message_text, attachment_file_paths) as request_kwargs:
+            if 'body' in request_kwargs:
+                request_kwargs['body'] = {'message': request_kwargs['body']}
+
+            resp = self._drafts.create(
+                userId='me',
+                **request_kwargs
+            ).execute(num_retries=self._max_retries)
 
         return resp
 
@@ -150,11 +387,16 @@ class GmailUtility:
         :return: API Response.
         """
 
-        resp = self._service.users().drafts().send(
+        resp = self._drafts.send(
             userId='me',
             body={'id': draft_id}
         ).execute(num_retries=self._max_retries)
 
+        # sent drafts no longer exist
+        with self._cache_lock:
+            for key in [x for x in self._cache.keys() if x[:2] == ('draft', draft_id)]:
+                self._cache.pop(key, None)
+
         return resp
 
     def send_email(self, sender, to, subject, message_text, attachment_file_paths=None):
@@ -173,11 +415,11 @@ class GmailUtility:
         :return: API response.
         """
 
-        message = create_message(sender, to, subject, message_text, attachment_file_paths)
-        resp = self._service.users().messages().send(
-            userId='me',
-            body=message
-        ).execute(num_retries=self._max_retries)
+        with _message_request(sender, to, subject, message_text, attachment_file_paths) as request_kwargs:
+            resp = self._messages.send(
+                userId='me',
+                **request_kwargs
+            ).execute(num_retries=self._max_retries)
 
         return resp
 
@@ -189,54 +431,53 @@ class GmailUtility:
         :return: Dictionary with parsed dates and attachment_data (ready to write to file!). Duplicate handling and overwriting logic **should** be handled externally when iterating over list of messages.
         """
 
-        def _get_attachment_data(msg_id, att_id):
-            return self._service.users().messages().attachments().get(
-                id=att_id,
-                messageId=msg_id,
-                userId='me'
-            ).execute(num_retries=self._max_retries)
+        def _list_attachments(payload):
+            # depth first walk over MIME parts, visiting each part once in document order
+            parts_list = []
+            stack = [payload]
 
-        def _list_attachments(obj, key, parts_list):
-            if isinstance(obj, dict):
-                try:
+            while stack:
+                part = stack.pop()
+
+                if 'attachmentId' in part.get('body', {}):
                     parts_list.append(
                         {
-                            'file_name': obj['filename'],
-                            'attachment_id': obj['body']['attachmentId'],
-                            'mime_type': obj['mimeType']
+                            'file_name': part['filename'],
+                            'attachment_id': part['body']['attachmentId'],
+                            'mime_type': part['mimeType']
                         }
                     )
-                except KeyError:
-                    pass
-
-            if key in obj and isinstance(obj[key], list):
-                for part in obj[key]:
-                    try:
-                        parts_list.append(
-                            {
-                                'file_name': part['filename'],
-                                'attachment_id': part['body']['attachmentId'],
-                                'mime_type': part['mimeType']
-                            }
-                        )
-                    except KeyError:
-                        pass
-
-                    if key in part:
-                        _list_attachments(part, key, parts_list)
+
+                stack.extend(reversed(part.get('parts', ())))
+
+            return parts_list
 
         message = self.get_message(message_id)
 
-        attachments = []
-        _list_attachments(message['payload'], 'parts', attachments)
+        attachments = _list_attachments(message['payload'])
+
+        # every attachment is fetched in a single batch request rather than one round trip each
+        attachments_data = execute_batch(
+            self._service,
+            dict(
+                (i, self._attachments.get(id=attachment['attachment_id'], messageId=message_id, userId='me'))
+                for i, attachment in enumerate(attachments)
+            ),
+            batch_size=50,
+            max_retries=self._max_retries
+        )
+
+        message_date = timestamp_to_datetime(message['internalDate'])
 
-        for attachment in attachments:
+        for i, attachment in enumerate(attachments):
             assert isinstance(attachment, dict)
 
-            attachment['date'] = timestamp_to_datetime(message['internalDate'])
-            attachment['message_id'] = message_id
+            attachment_data = attachments_data[i]
+            if isinstance(attachment_data, Exception):
+                raise attachment_data
 
-            attachment_data = _get_attachment_data(message_id, attachment['attachment_id'])
-            attachment['attachment_data'] = base64.urlsafe_b64decode(attachment_data['data'].encode('utf-8'))
+            attachment['date'] = message_date
+            attachment['message_id'] = message_id
+            attachment['attachment_data'] = _decode_attachment_data(attachment_data['data'])
 
         return attachments
@@ -1,15 +1,44 @@
 import os
+import re
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 import mimetypes
+from functools import lru_cache
 from email.utils import COMMASPACE
-import base64
+from email.message import EmailMessage
+from email.generator import BytesGenerator
+from email import encoders
+from tempfile import SpooledTemporaryFile
+
+# SIMD accelerated base64 if available
+try:
+    from pybase64 import urlsafe_b64encode
+except ImportError:
+    from base64 import urlsafe_b64encode
 
 from gwrappy.utils import datetime_to_timestamp
 
 
+def _q_terms(k, v):
+    if k in ('has', 'is'):
+        if isinstance(v, list):
+            for element in v:
+                yield '%s:%s' % (k, element)
+        else:
+            yield '%s:%s' % (k, v)
+
+    elif k in ('before', 'after'):
+        yield '%s:%s' % (k, datetime_to_timestamp(v))
+
+    elif isinstance(v, list):
+        yield ' OR '.join('%s:%s' % (k, element) for element in v)
+
+    else:
+        yield '%s:%s' % (k, v)
+
+
 def generate_q(**kwargs):
     """
     Generate query for searching messages. [https://support.google.com/mail/answer/7190]
@@ -18,31 +47,56 @@ def generate_q(**kwargs):
     :return: String representation of search q
     """
 
-    parsed_q = []
+    q = ' '.join(term for k, v in kwargs.items() for term in _q_terms(k, v))
 
-    for k, v in kwargs.items():
-        if k in ('has', 'is'):
-            if isinstance(v, list):
-                for element in v:
-                    parsed_q.append('%s:%s' % (k, element))
-            else:
-                parsed_q.append('%s:%s' % (k, v))
+    return q if q else None
 
-        elif k in ('before', 'after'):
-            parsed_q.append('%s:%s' % (k, datetime_to_timestamp(v)))
 
-        else:
-            if isinstance(v, list):
-                parsed_q.append(
-                    ' OR '.join(['%s:%s' % (k, element) for element in v])
-                )
-            else:
-                parsed_q.append('%s:%s' % (k, v))
+@lru_cache(maxsize=256)
+def _attachment_type(extension):
+    # (main type, sub type) per file extension, the mimetypes registry is only consulted once for each
+    content_type, encoding = mimetypes.guess_type('attachment%s' % extension)
 
-    return None if len(parsed_q) == 0 else ' '.join(parsed_q)
+    # compressed files are attached as is
+    if content_type is None or encoding is not None:
+        content_type = 'application/octet-stream'
 
+    return tuple(content_type.split('/', 1))
+
+
+def create_simple_message(sender, to, subject, message_text):
+    """
+    Plain text message without attachments. Skips the multipart structure create_message() builds to support html and attachments.
+
+    :param sender: Name of sender
+    :type sender: string
+    :param to: One or more recipients.
+    :type to: string or list
+    :param subject: Subject text
+    :param message_text: Message string.
+    :type message_text: string
+    :return: Dictionary with the raw, url-safe base64 encoded message.
+    """
+
+    if not isinstance(to, list):
+        to = [to]
+
+    message = EmailMessage()
+    message['to'] = COMMASPACE.join(to)
+    message['from'] = sender
+    message['subject'] = subject
+    message.set_content(message_text)
+
+    return {'raw': urlsafe_b64encode(message.as_bytes()).decode('ascii')}
+
+
+def build_message(sender, to, subject, message_text, attachment_paths=None):
+    """
+    MIME message with optional html parts and attachments, see create_message() for parameters.
+
+    :return: email.mime.multipart.MIMEMultipart object.
+    """
 
-def create_message(sender, to, subject, message_text, attachment_paths=None):
     def __generate_msg_part(part):
         assert isinstance(part, dict)
         assert 'text' in part
@@ -53,7 +107,7 @@ def create_message(sender, to, subject, message_text, attachment_paths=None):
             msg_type = part['type']
 
         mime_part = MIMEText(
-            part['text'].encode('utf-8'),
+            part['text'],
             _subtype=msg_type,
             _charset='utf-8'
         )
@@ -63,8 +117,11 @@ def create_message(sender, to, subject, message_text, attachment_paths=None):
     if not isinstance(to, list):
         to = [to]
 
-    if message_text is None or isinstance(message_text, (unicode, str)):
-        msgs = [MIMEText(message_text.encode('utf-8'), _charset='utf-8')]
+    if message_text is None:
+        msgs = [MIMEText('', _charset='utf-8')]
+
+    elif isinstance(message_text, str):
+        msgs = [MIMEText(message_text, _charset='utf-8')]
 
     elif isinstance(message_text, dict):
         msgs = [__generate_msg_part(message_text)]
@@ -95,7 +152,7 @@ def create_message(sender, to, subject, message_text, attachment_paths=None):
             message_alt.attach(msg)
 
     # create 'related' part if html is required
-    content_msgs = filter(lambda x: x.get_content_subtype() == 'html' or x.get_content_maintype() == 'image', msgs)
+    content_msgs = [x for x in msgs if x.get_content_subtype() == 'html' or x.get_content_maintype() == 'image']
 
     if len(content_msgs) > 0:
         message_related = MIMEMultipart('related')
@@ -113,28 +170,63 @@ def create_message(sender, to, subject, message_text, attachment_paths=None):
             raise TypeError('Invalid input. Only acceptable types are str and list objects')
 
         for file_path in attachment_paths:
-            content_type, encoding = mimetypes.guess_type(file_path)
-
-            if content_type is None or encoding is not None:
-                content_type = 'application/octet-stream'
-
-            main_type, sub_type = content_type.split('/', 1)
+            main_type, sub_type = _attachment_type(os.path.splitext(file_path)[1].lower())
 
             with open(file_path, 'rb') as fp:
-                if main_type == 'text':
-                    msg = MIMEText(fp.read(), _subtype=sub_type)
-
-                elif main_type == 'image':
+                if main_type == 'image':
                     msg = MIMEImage(fp.read(), _subtype=sub_type)
 
                 else:
                     msg = MIMEBase(main_type, sub_type)
                     msg.set_payload(fp.read())
+                    encoders.encode_base64(msg)
 
             msg.add_header('Content-Disposition', 'attachment', filename=os.path.basename(file_path))
             message.attach(msg)
 
-    return {'raw': base64.urlsafe_b64encode(message.as_string())}
+    return message
+
+
+def write_message(message, spool_size=1024 * 1024):
+    """
+    Serializes a MIME message into a file object, for sending as a message/rfc822 media upload rather than base64 encoding it into the request body.
+
+    :param message: email.message.Message object, eg. from build_message()
+    :param spool_size: Messages larger than this many bytes are spooled to a temporary file instead of held in memory.
+    :type spool_size: integer
+    :return: Binary file object positioned at the start of the message.
+    """
+
+    spool = SpooledTemporaryFile(max_size=spool_size)
+    BytesGenerator(spool, mangle_from_=False).flatten(message)
+    spool.seek(0)
+
+    return spool
+
+
+def create_message(sender, to, subject, message_text, attachment_paths=None):
+    """
+    Message with optional html parts and attachments.
+
+    :param sender: Name of sender
+    :type sender: string
+    :param to: One or more recipients.
+    :type to: string or list
+    :param subject: Subject text
+    :param message_text: Message string, or one or more dict representations of message parts. If dict, keys required are **type** and **text**.
+    :type message_text: string, dict, or list of dicts
+    :param attachment_paths: One or more file paths of attachments.
+    :type attachment_paths: string or list
+    :return: Dictionary with the raw, url-safe base64 encoded message.
+    """
+
+    # plain text without attachments doesn't need the multipart structure
+    if attachment_paths is None and isinstance(message_text, str):
+        return create_simple_message(sender, to, subject, message_text)
+
+    message = build_message(sender, to, subject, message_text, attachment_paths)
+
+    return {'raw': urlsafe_b64encode(message.as_bytes()).decode('ascii')}
 
 
 def list_to_html(data, has_header=True, table_format=None):
@@ -152,8 +244,9 @@ def list_to_html(data, has_header=True, table_format=None):
 
     from tabulate import tabulate
 
+    # slicing rather than popping leaves the caller's data untouched
     if has_header:
-        header = data.pop(0)
+        header, data = data[0], data[1:]
     else:
         header = ()
 
@@ -170,7 +263,11 @@ def list_to_html(data, has_header=True, table_format=None):
         if isinstance(table_format, dict):
             assert all([key in ('table', 'th', 'tr', 'td') for key in table_format.keys()])
 
-            for k, v in table_format.items():
-                table_html = table_html.replace('<%s>' % k, '<%s style="%s">' % (k, v))
+            # styles every tag in a single pass over the table
+            table_html = re.sub(
+                r'<(%s)>' % '|'.join(table_format.keys()),
+                lambda m: '<%s style="%s">' % (m.group(1), table_format[m.group(1)]),
+                table_html
+            )
 
     return table_html
@@ -1,16 +1,183 @@
-from __future__ import absolute_import
-from googleapiclient.discovery import build
+import os
+import json
+import time
+import threading
+
+from googleapiclient.discovery import build_from_document
+from googleapiclient.model import JsonModel
 from .scopes import SCOPES
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+else:
+    # types json.dumps() can't encode, or encodes differently, are passed through for orjson to reject
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
 
-def get_service(service_name, **kwargs):
+
+class OrjsonModel(JsonModel):
+    """
+    JsonModel that encodes request bodies and decodes responses with orjson. Used in place of the default model when orjson is installed.
+
+    Bodies orjson can't encode the same way as json.dumps(), eg. datetimes, dataclasses, subclasses of builtin types, non-string keys and integers exceeding 64 bits, are encoded with json.dumps() instead, so the payload matches the default model's, or TypeError is raised as it would be.
+    The exceptions are NaN and infinity, which orjson encodes as null where json.dumps() writes invalid JSON, and UUIDs and enums, which orjson encodes where json.dumps() raises TypeError.
+    """
+
+    def serialize(self, body_value):
+        if isinstance(body_value, dict) and 'data' not in body_value and self._data_wrapper:
+            body_value = {'data': body_value}
+
+        try:
+            return orjson.dumps(body_value, option=_ORJSON_OPTIONS).decode('utf-8')
+        except TypeError:
+            return json.dumps(body_value)
+
+    def deserialize(self, content):
+        body = orjson.loads(content)
+
+        if self._data_wrapper and isinstance(body, dict) and 'data' in body:
+            body = body['data']
+        return body
+
+
+# discovery documents fetched for services without a pinned copy are kept here between processes
+_DISCOVERY_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'gwrappy', 'discovery')
+_DISCOVERY_CACHE_TTL = 24 * 60 * 60
+
+# (service name, version) to raw discovery document, parsed afresh for each build as building mutates it
+_discovery_documents = {}
+_discovery_lock = threading.Lock()
+
+
+def _discovery_document_path(service_name, version):
+    # discovery documents pinned within the package, eg. gwrappy/compute/compute_v1_discovery.json
+    return os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        service_name,
+        '%s_%s_discovery.json' % (service_name, version)
+    )
+
+
+def _cached_discovery_document_path(service_name, version):
+    return os.path.join(_DISCOVERY_CACHE_DIR, '%s_%s_discovery.json' % (service_name, version))
+
+
+def _fetch_discovery_document(service_name, version):
+    import httplib2
+
+    resp, content = httplib2.Http().request(
+        'https://www.googleapis.com/discovery/v1/apis/%s/%s/rest' % (service_name, version)
+    )
+
+    if resp.status != 200:
+        from gwrappy.errors import HttpError
+        raise HttpError(resp, content)
+
+    return content
+
+
+def _read_discovery_document(service_name, version):
+    doc_path = _discovery_document_path(service_name, version)
+
+    if os.path.isfile(doc_path):
+        with open(doc_path, 'rb') as doc_file:
+            return doc_file.read()
+
+    cache_path = _cached_discovery_document_path(service_name, version)
+
+    try:
+        if time.time() - os.path.getmtime(cache_path) < _DISCOVERY_CACHE_TTL:
+            with open(cache_path, 'rb') as doc_file:
+                return doc_file.read()
+    except OSError:
+        pass
+
+    content = _fetch_discovery_document(service_name, version)
+
+    try:
+        os.makedirs(_DISCOVERY_CACHE_DIR, exist_ok=True)
+
+        # written to a temporary file first so concurrent processes never read a partial document
+        tmp_path = '%s.%i.tmp' % (cache_path, os.getpid())
+        with open(tmp_path, 'wb') as doc_file:
+            doc_file.write(content)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # the on-disk cache is best effort, eg. read-only home directories
+        pass
+
+    return content
+
+
+def _load_discovery_document(service_name, version):
+    key = (service_name, version)
+
+    with _discovery_lock:
+        content = _discovery_documents.get(key)
+
+        if content is None:
+            content = _read_discovery_document(service_name, version)
+            _discovery_documents[key] = content
+
+    if orjson is not None:
+        return orjson.loads(content)
+    else:
+        return json.loads(content.decode('utf-8'))
+
+
+def _build(service_name, version, **kwargs):
+    # discovery documents are only read or fetched once per process
+    return build_from_document(_load_discovery_document(service_name, version), **kwargs)
+
+
+def refresh_discovery_documents(service_names=None):
+    """
+    Downloads the latest discovery documents over the pinned copies shipped within the package.
+
+    :param service_names: Services to refresh. If None, every service with a pinned discovery document is refreshed.
+    :type service_names: list
+    :return: List of paths written to.
+    """
+
+    if service_names is None:
+        service_names = [
+            x for x in sorted(SCOPES.keys())
+            if os.path.isfile(_discovery_document_path(x, SCOPES[x]['version']))
+        ]
+
+    written = []
+
+    for service_name in service_names:
+        version = SCOPES[service_name]['version']
+        content = _fetch_discovery_document(service_name, version)
+
+        doc_path = _discovery_document_path(service_name, version)
+        with open(doc_path, 'w') as doc_file:
+            json.dump(json.loads(content.decode('utf-8')), doc_file, separators=(',', ':'), sort_keys=True)
+
+        with _discovery_lock:
+            _discovery_documents.pop((service_name, version), None)
+
+        written.append(doc_path)
+
+    return written
+
+
+def refresh_discovery_documents_cli():
+    import sys
+
+    for doc_path in refresh_discovery_documents(sys.argv[1:] or None):
+        print('Updated %s' % doc_path)
+
+
+def get_credentials(service_name, **kwargs):
     service_scope = SCOPES[service_name]
 
     if 'json_credentials_path' in kwargs:
         # store in multistore_file by default, requires client_id as a key
         assert 'client_id' in kwargs, 'client_id required when using json_credential_path'
 
-        import httplib2
         from oauth2client.contrib import multistore_file
 
         storage = multistore_file.get_credential_storage(
@@ -33,22 +200,38 @@ def get_service(service_name, **kwargs):
             FLOW = flow_from_clientsecrets(kwargs['client_secret_path'], scope=service_scope['scope'])
             credentials = run_flow(FLOW, storage, None)
 
-        # Create an httplib2.Http object and authorize it with your credentials
-        http = httplib2.Http()
-        http = credentials.authorize(http)
-
-        return build(
-            service_name,
-            service_scope['version'],
-            http=http
-        )
-
     else:
         from oauth2client.client import GoogleCredentials
         credentials = GoogleCredentials.get_application_default()
 
-        return build(
-            service_name,
-            service_scope['version'],
-            credentials=credentials
+        if credentials.create_scoped_required():
+            credentials = credentials.create_scoped(service_scope['scope'])
+
+    return credentials
+
+
+def get_http(credentials, timeout=None):
+    import httplib2
+
+    # Create an httplib2.Http object and authorize it with your credentials
+    # connections are kept alive and reused by every request made through this object
+    http = httplib2.Http(timeout=timeout)
+    return credentials.authorize(http)
+
+
+def get_service(service_name, **kwargs):
+    # an authorized http object can be passed in to share connections across services
+    if 'http' in kwargs:
+        http = kwargs['http']
+    else:
+        http = get_http(
+            get_credentials(service_name, **kwargs),
+            timeout=kwargs.get('http_timeout', None)
         )
+
+    return _build(
+        service_name,
+        SCOPES[service_name]['version'],
+        http=http,
+        model=OrjsonModel() if orjson is not None else None
+    )
@@ -1,21 +1,36 @@
+import io
+import os
+import logging
 from time import sleep
 import random
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
+from concurrent.futures import ThreadPoolExecutor
 
-# python 2/3 compatibility
-try:
-    from urllib2 import quote
-except ImportError:
-    from urllib.request import quote
+from urllib.parse import quote
 
 from httplib2 import HttpLib2Error
 
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-from gwrappy.service import get_service
-from gwrappy.utils import iterate_list
+from googleapiclient.http import MediaIoBaseDownload
+from gwrappy.service import get_service, get_credentials, get_http
+from gwrappy.utils import iterate_list, execute_batch, mapped_media
 from gwrappy.errors import HttpError
 from gwrappy.storage.utils import GcsResponse
 
 
+logger = logging.getLogger(__name__)
+
+# download chunks double after every successful chunk up to this size
+_MAX_DOWNLOAD_CHUNKSIZE = 64 * 1024 * 1024
+
+
+def _list_fields(fields):
+    # paging relies on nextPageToken, so it's always part of a partial list response
+    if fields is None or 'nextPageToken' in fields:
+        return fields
+    return 'nextPageToken, %s' % fields
+
+
 class GcsUtility:
     def __init__(self, **kwargs):
         """
@@ -31,19 +46,34 @@ class GcsUtility:
         :keyword client_secret_path: File path for client secret JSON file. Only required if credentials are invalid or unavailable.
         :keyword json_credentials_path: File path for automatically generated credentials.
         :keyword client_id: Credentials are stored as a key-value pair per client_id to facilitate multiple clients using the same credentials file. For simplicity, using one's email address is sufficient.
+        :keyword http: Authorized httplib2.Http object, eg. from gwrappy.service.get_http(). Allows connections to be shared across Utility objects.
+        :keyword http_timeout: Socket timeout in seconds for API calls.
+        :type http_timeout: integer
         """
 
+        if 'http' in kwargs:
+            # credentials are unknown for a shared http, so multi-object transfers run one at a time
+            self._credentials = None
+        else:
+            self._credentials = get_credentials('storage', **kwargs)
+            kwargs['http'] = get_http(self._credentials, timeout=kwargs.get('http_timeout', None))
+
         self._service = get_service('storage', **kwargs)
+        self._http_timeout = kwargs.get('http_timeout', None)
+
+        # httplib2.Http isn't thread-safe, so each concurrent worker borrows a service with its own authorized Http
+        # they're kept across calls so their connections and TLS sessions are reused rather than re-established
+        self._worker_services = LifoQueue()
 
         self._max_retries = kwargs.get('max_retries', 3)
 
-        # Number of bytes to send/receive in each request.
-        self._chunksize = kwargs.get('chunksize', 2 * 1024 * 1024)
+        # Number of bytes to send/receive in each request, a multiple of 256KB.
+        self._chunksize = kwargs.get('chunksize', 8 * 1024 * 1024)
 
         # Retry transport and file IO errors.
         self._RETRYABLE_ERRORS = (HttpLib2Error, IOError)
 
-    def list_buckets(self, project_id, max_results=None, filter_exp=None):
+    def list_buckets(self, project_id, max_results=None, filter_exp=None, prefetch=False, fields=None):
         """
         Abstraction of buckets().list() method with inbuilt iteration functionality. [https://cloud.google.com/storage/docs/json_api/v1/buckets/list]
 
@@ -53,7 +83,11 @@ class GcsUtility:
         :type max_results: integer
         :param filter_exp: Function that filters entries if filter_exp evaluates to True.
         :type filter_exp: function
-        :return: List of dictionary objects representing bucket resources.
+        :param prefetch: If True, the next page is fetched in a background thread while the current page is iterated over. Avoid making other calls with this object while iterating.
+        :type prefetch: boolean
+        :param fields: Partial response selector, eg. 'items(name, size, updated)'. If None, whole resources are returned.
+        :type fields: string
+        :return: Generator of dictionary objects representing bucket resources.
         """
 
         return iterate_list(
@@ -62,10 +96,12 @@ class GcsUtility:
             max_results,
             self._max_retries,
             filter_exp,
-            project=project_id
+            prefetch=prefetch,
+            project=project_id,
+            fields=_list_fields(fields)
         )
 
-    def list_objects(self, bucket_name, max_results=None, prefix=None, projection=None, filter_exp=None):
+    def list_objects(self, bucket_name, max_results=None, prefix=None, projection=None, filter_exp=None, prefetch=False, fields=None):
         """
         Abstraction of objects().list() method with inbuilt iteration functionality. [https://cloud.google.com/storage/docs/json_api/v1/objects/list]
 
@@ -78,7 +114,11 @@ class GcsUtility:
         :param projection: Set of properties to return.
         :param filter_exp: Function that filters entries if filter_exp evaluates to True.
         :type filter_exp: function
-        :return: List of dictionary objects representing object resources.
+        :param prefetch: If True, the next page is fetched in a background thread while the current page is iterated over. Avoid making other calls with this object while iterating.
+        :type prefetch: boolean
+        :param fields: Partial response selector, eg. 'items(name, size, updated)'. If None, whole resources are returned.
+        :type fields: string
+        :return: Generator of dictionary objects representing object resources.
         """
 
         return iterate_list(
@@ -87,9 +127,11 @@ class GcsUtility:
             max_results,
             self._max_retries,
             filter_exp,
+            prefetch=prefetch,
             bucket=bucket_name,
             prefix=prefix,
-            projection=projection
+            projection=projection,
+            fields=_list_fields(fields)
         )
 
     @staticmethod
@@ -118,6 +160,38 @@ class GcsUtility:
 
         return resp
 
+    def get_objects(self, bucket_name, object_names, projection=None):
+        """
+        Get multiple objects, batched into as few HTTP requests as possible.
+
+        :param bucket_name: Bucket identifier.
+        :type bucket_name: string
+        :param object_names: Each can take string representation of object resource or list denoting path to object on GCS.
+        :type object_names: list
+        :param projection: Set of properties to return.
+        :return: List of dictionary objects representing object resources, in the same order as object_names.
+        :raises: HttpError if any request fails.
+        """
+
+        object_names = [self._parse_object_name(x) for x in object_names]
+
+        # Cloud Storage accepts at most 100 calls per batch request
+        resp = execute_batch(
+            self._service,
+            dict(
+                (object_name, self._service.objects().get(bucket=bucket_name, object=object_name, projection=projection))
+                for object_name in object_names
+            ),
+            batch_size=100,
+            max_retries=self._max_retries
+        )
+
+        for object_name in object_names:
+            if isinstance(resp[object_name], Exception):
+                raise resp[object_name]
+
+        return [resp[x] for x in object_names]
+
     def update_object(self, bucket_name, object_name, predefined_acl=None, projection=None, **object_resource):
         """
         Abstraction of objects().update() method. [https://cloud.google.com/storage/docs/json_api/v1/objects/update]
@@ -164,14 +238,37 @@ class GcsUtility:
 
     def _handle_progressless_iter(self, error, progressless_iters):
         if progressless_iters > self._max_retries:
-            print('Failed to make progress for too many consecutive iterations.')
+            logger.error('Failed to make progress for too many consecutive iterations.')
             raise error
 
-        sleep_time = random.random() * (2 ** progressless_iters)
-        print('Caught exception (%s). Sleeping for %s seconds before retry #%d.' %
-              (str(error), sleep_time, progressless_iters))
+        sleep_time = random.random() * (1 << progressless_iters)
+        logger.warning('Caught exception (%s). Sleeping for %.2f seconds before retry #%d.', error, sleep_time, progressless_iters)
         sleep(sleep_time)
 
+    @contextmanager
+    def _worker_service(self):
+        try:
+            service = self._worker_services.get_nowait()
+        except Empty:
+            service = get_service('storage', http=get_http(self._credentials, timeout=self._http_timeout))
+
+        try:
+            yield service
+        finally:
+            self._worker_services.put(service)
+
+    def _map_workers(self, func, items, parallel_workers):
+        # runs func(service, item) for each item, returning results in the same order as items
+        if self._credentials is None or parallel_workers <= 1:
+            return [func(self._service, item) for item in items]
+
+        def _run(item):
+            with self._worker_service() as service:
+                return func(service, item)
+
+        with ThreadPoolExecutor(max_workers=parallel_workers) as executor:
+            return list(executor.map(_run, items))
+
     def download_object(self, bucket_name, object_name, write_path):
         """
         Downloads object in chunks.
@@ -186,38 +283,62 @@ class GcsUtility:
         :raises: HttpError if non-retryable errors are encountered.
         """
 
+        return self._download_object(self._service, bucket_name, object_name, write_path)
+
+    def _download_object(self, service, bucket_name, object_name, write_path):
         resp_obj = GcsResponse('downloaded')
 
-        req = self._service.objects().get_media(
+        # metadata is fetched once up front, for preallocating the file and for the response
+        object_resource = service.objects().get(
             bucket=bucket_name,
             object=self._parse_object_name(object_name)
+        ).execute(num_retries=self._max_retries)
+        size = int(object_resource['size'])
+
+        req = service.objects().get_media(
+            bucket=bucket_name,
+            object=self._parse_object_name(object_name),
+            generation=object_resource['generation']
         )
 
-        write_file = file(write_path, 'wb')
-        media = MediaIoBaseDownload(write_file, req, chunksize=self._chunksize)
-
-        progressless_iters = 0
-        done = False
-
-        while not done:
-            error = None
-            try:
-                progress, done = media.next_chunk()
-            except HttpError as e:
-                error = e
-                if e.resp.status < 500:
-                    raise
-            except self._RETRYABLE_ERRORS as e:
-                error = e
-
-            if error:
-                progressless_iters += 1
-                self._handle_progressless_iter(error, progressless_iters)
-            else:
-                progressless_iters = 0
+        with io.open(write_path, 'wb', buffering=max(self._chunksize, 8 * 1024 * 1024)) as write_file:
+            if size > 0 and hasattr(os, 'posix_fallocate'):
+                # reserve the whole file at once rather than extending it on every chunk
+                # preallocation is only an optimisation, so filesystems without support for it fall back to extending the file
+                try:
+                    os.posix_fallocate(write_file.fileno(), 0, size)
+                except OSError:
+                    pass
+
+            media = MediaIoBaseDownload(write_file, req, chunksize=self._chunksize)
+
+            progressless_iters = 0
+            done = False
+
+            while not done:
+                error = None
+                try:
+                    progress, done = media.next_chunk()
+                except HttpError as e:
+                    error = e
+                    if e.resp.status < 500:
+                        raise
+                except self._RETRYABLE_ERRORS as e:
+                    error = e
+
+                # larger ranges amortize per request overhead on big objects, shrink back on errors
+                if error:
+                    media._chunksize = max(media._chunksize // 2, self._chunksize)
+
+                    progressless_iters += 1
+                    self._handle_progressless_iter(error, progressless_iters)
+                else:
+                    media._chunksize = min(media._chunksize * 2, max(_MAX_DOWNLOAD_CHUNKSIZE, self._chunksize))
+
+                    progressless_iters = 0
 
         resp_obj.load_resp(
-            self.get_object(bucket_name, object_name),
+            object_resource,
             is_download=True
         )
         return resp_obj
@@ -240,41 +361,40 @@ class GcsUtility:
         :returns: GcsResponse object.
         :raises: HttpError if non-retryable errors are encountered.
         """
-        resp_obj = GcsResponse('uploaded')
-
-        media = MediaFileUpload(read_path, chunksize=self._chunksize, resumable=True)
-
-        if not media.mimetype():
-            media = MediaFileUpload(read_path, 'application/octet-stream', resumable=True)
-
-        req = self._service.objects().insert(
-            bucket=bucket_name,
-            name=self._parse_object_name(object_name),
-            media_body=media,
+        return self._upload_object(self._service, bucket_name, object_name, read_path, predefined_acl, projection, object_resource)
 
-            predefinedAcl=predefined_acl,
-            projection=projection,
-            body=object_resource
-        )
+    def _upload_object(self, service, bucket_name, object_name, read_path, predefined_acl, projection, object_resource):
+        resp_obj = GcsResponse('uploaded')
 
-        progressless_iters = 0
-        resp = None
-        while resp is None:
-            error = None
-            try:
-                progress, resp = req.next_chunk()
-            except HttpError as e:
-                error = e
-                if e.resp.status < 500:
-                    raise
-            except self._RETRYABLE_ERRORS as e:
-                error = e
-
-            if error:
-                progressless_iters += 1
-                self._handle_progressless_iter(error, progressless_iters)
-            else:
-                progressless_iters = 0
+        with mapped_media(read_path, self._chunksize) as media:
+            req = service.objects().insert(
+                bucket=bucket_name,
+                name=self._parse_object_name(object_name),
+                media_body=media,
+
+                predefinedAcl=predefined_acl,
+                projection=projection,
+                body=object_resource
+            )
+
+            progressless_iters = 0
+            resp = None
+            while resp is None:
+                error = None
+                try:
+                    progress, resp = req.next_chunk()
+                except HttpError as e:
+                    error = e
+                    if e.resp.status < 500:
+                        raise
+                except self._RETRYABLE_ERRORS as e:
+                    error = e
+
+                if error:
+                    progressless_iters += 1
+                    self._handle_progressless_iter(error, progressless_iters)
+                else:
+                    progressless_iters = 0
 
         resp_obj.load_resp(
             resp,
@@ -282,3 +402,45 @@ class GcsUtility:
         )
 
         return resp_obj
+
+    def download_objects(self, bucket_name, objects, parallel_workers=8):
+        """
+        Downloads multiple objects concurrently, each over its own connection. Falls back to downloading one at a time if the http object was passed in.
+
+        :param bucket_name: Bucket identifier.
+        :type bucket_name: string
+        :param objects: (object_name, write_path) pairs, see download_object().
+        :type objects: list of tuples
+        :param parallel_workers: Maximum number of objects downloaded at once.
+        :type parallel_workers: integer
+        :returns: List of GcsResponse objects, in the same order as objects.
+        :raises: HttpError if non-retryable errors are encountered.
+        """
+
+        return self._map_workers(
+            lambda service, x: self._download_object(service, bucket_name, x[0], x[1]),
+            objects,
+            parallel_workers
+        )
+
+    def upload_objects(self, bucket_name, objects, parallel_workers=8, predefined_acl=None, projection=None):
+        """
+        Uploads multiple objects concurrently, each over its own connection. Falls back to uploading one at a time if the http object was passed in.
+
+        :param bucket_name: Bucket identifier.
+        :type bucket_name: string
+        :param objects: (object_name, read_path) pairs, see upload_object().
+        :type objects: list of tuples
+        :param parallel_workers: Maximum number of objects uploaded at once.
+        :type parallel_workers: integer
+        :param predefined_acl: Apply a predefined set of access controls to every object.
+        :param projection: Set of properties to return.
+        :returns: List of GcsResponse objects, in the same order as objects.
+        :raises: HttpError if non-retryable errors are encountered.
+        """
+
+        return self._map_workers(
+            lambda service, x: self._upload_object(service, bucket_name, x[0], x[1], predefined_acl, projection, {}),
+            objects,
+            parallel_workers
+        )
@@ -1,9 +1,13 @@
 from datetime import datetime
+from time import monotonic
 from pytz import UTC
-import humanize
+
+from gwrappy.utils import rfc3339_to_datetime, naturalsize
 
 
 class GcsResponse:
+    __slots__ = ('description', 'start_time', 'resp', 'time_taken', 'full_path', '_start_monotonic')
+
     def __init__(self, description):
         """
         Wrapper for GCS upload and download responses, mainly for calculating/parsing job statistics into human readable formats for logging.
@@ -11,10 +15,14 @@ class GcsResponse:
         :param description: String descriptor for specific function of job.
         """
         self.description = description.strip().title()
+        self.resp = None
+        self.time_taken = None
+        self.full_path = None
         self.start()
 
     def start(self):
-        setattr(self, 'start_time', datetime.now(UTC))
+        self.start_time = datetime.now(UTC)
+        self._start_monotonic = monotonic()
 
     def load_resp(self, resp, is_download):
         """
@@ -27,27 +35,31 @@ class GcsResponse:
         """
 
         assert isinstance(resp, dict)
-        setattr(self, 'resp', resp)
-        setattr(self, 'size', humanize.naturalsize(int(resp['size'])))
+        self.resp = resp
 
         if is_download:
-            updated_at = datetime.now(UTC)
+            elapsed = int(monotonic() - self._start_monotonic)
         else:
-            updated_at = UTC.localize(datetime.strptime(resp['updated'], '%Y-%m-%dT%H:%M:%S.%fZ'))
+            updated_at = rfc3339_to_datetime(resp['updated'])
+            elapsed = (updated_at - self.start_time).seconds if updated_at > self.start_time else 0
+
+        self.time_taken = dict(zip(('m', 's'), divmod(elapsed, 60)))
 
-        setattr(self, 'time_taken', dict(zip(
-            ('m', 's'),
-            divmod((updated_at - getattr(self, 'start_time')).seconds if updated_at > getattr(self, 'start_time') else 0, 60)
-        )))
+        self.full_path = 'gs://%s/%s' % (resp['bucket'], resp['name'])
 
-        setattr(self, 'full_path', 'gs://%s/%s' % (resp['bucket'], resp['name']))
+    @property
+    def size(self):
+        # only formatted when inspected, eg. for logging
+        if self.resp is None or 'size' not in self.resp:
+            return None
+        return naturalsize(int(self.resp['size']))
 
     def __repr__(self):
         return '[GCS] %s %s %s(%s)' % (
             self.description,
-            getattr(self, 'full_path'),
-            '%s ' % getattr(self, 'size') if hasattr(self, 'size') else '',
-            '{m} Minutes {s} Seconds'.format(**getattr(self, 'time_taken'))
+            self.full_path,
+            '%s ' % self.size if self.size is not None else '',
+            '{m} Minutes {s} Seconds'.format(**self.time_taken)
         )
 
     __str__ = __repr__
@@ -1,91 +1,239 @@
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+from time import sleep
 from pytz import timezone
 from tzlocal import get_localzone
 
+import io
+import copy
+import random
+import re
+import calendar
+import os
+import mmap
+import mimetypes
 import logging
-
-# python 2/3 compatibility
-try:
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
-
-
-def iterate_list(service, object_name, max_results=None, max_retries=3, filter_exp=None, break_condition=None, **kwargs):
+import threading
+from functools import lru_cache
+from contextlib import contextmanager
+from queue import Queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iterate_list(service, object_name, max_results=None, max_retries=3, filter_exp=None, break_condition=None, prefetch=False, **kwargs):
+    # yields one object at a time, only the current page is held in memory
+    # the next page is only requested once the current page is exhausted, so callers breaking early skip remaining pages
+    # with prefetch, the next page is instead requested in a background thread while the current page is consumed
+    # the service's http object isn't thread-safe, so prefetch is only safe if the consumer doesn't make calls with the same service meanwhile
     object_count = 0
 
-    resp = service.list(
-        **kwargs if kwargs is not None else {}
-    ).execute(num_retries=max_retries)
-
-    if object_name in resp:
-        for x in resp[object_name]:
-            if filter_exp is not None and not filter_exp(x):
-                continue
+    if max_results is not None and max_results <= 0:
+        return
 
-            # if max_results is None, get all results
-            if max_results is not None and object_count >= max_results:
-                resp.pop('nextPageToken', None)
-                break
-
-            # break condition mainly used to limit jobs dates which are sorted in reverse chronological order
-            if break_condition is not None and break_condition(x):
-                resp.pop('nextPageToken', None)
-                break
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
 
-            object_count += 1
-            yield x
+    try:
+        req = service.list(**kwargs)
+        resp = req.execute(num_retries=max_retries)
 
-    while 'nextPageToken' in resp:
-        page_token = resp.get('nextPageToken', None)
+        while True:
+            next_req = service.list_next(req, resp)
 
-        resp = service.list(
-            pageToken=page_token,
-            **kwargs if kwargs is not None else {}
-        ).execute(num_retries=max_retries)
+            next_resp = None
+            if executor is not None and next_req is not None:
+                next_resp = executor.submit(next_req.execute, num_retries=max_retries)
 
-        if object_name in resp:
-            for x in resp[object_name]:
+            for x in resp.get(object_name, []):
                 if filter_exp is not None and not filter_exp(x):
                     continue
 
-                if max_results is not None and object_count >= max_results:
-                    resp.pop('nextPageToken', None)
-                    break
-
+                # break condition mainly used to limit jobs dates which are sorted in reverse chronological order
                 if break_condition is not None and break_condition(x):
-                    resp.pop('nextPageToken', None)
-                    break
+                    return
 
                 object_count += 1
                 yield x
 
+                # if max_results is None, get all results
+                if max_results is not None and object_count >= max_results:
+                    return
+
+            if next_req is None:
+                return
+
+            req = next_req
+            resp = next_resp.result() if next_resp is not None else req.execute(num_retries=max_retries)
+
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def execute_batch(service, requests, batch_size=1000, max_retries=3):
+    """
+    Executes multiple requests with as few HTTP calls as possible using BatchHttpRequest.
+    Requests failing with 429 or 5xx are retried with exponential backoff, only the failed requests being sent in the next batch.
+
+    :param service: Service object the requests were created from.
+    :param requests: Requests to execute.
+    :type requests: dictionary of key to HttpRequest objects
+    :param batch_size: Maximum number of requests per batch. Most APIs accept 1000, Gmail rate limits batches larger than 50.
+    :type batch_size: integer
+    :param max_retries: Maximum number of times failed requests are retried.
+    :type max_retries: integer
+    :return: Dictionary keyed similarly to requests, with values being the API response or the HttpError raised for that request.
+    """
+
+    from googleapiclient.errors import HttpError
+
+    keys = list(requests.keys())
+    responses = {}
+
+    for retry_num in range(max_retries + 1):
+        if retry_num > 0:
+            sleep(random.random() * (2 ** retry_num))
+
+        retry_keys = set()
+
+        for i in range(0, len(keys), batch_size):
+            batch_keys = keys[i:i + batch_size]
+
+            def _callback(request_id, response, exception, batch_keys=batch_keys):
+                key = batch_keys[int(request_id)]
+                responses[key] = response if exception is None else exception
+
+                if isinstance(exception, HttpError) and (exception.resp.status == 429 or exception.resp.status >= 500):
+                    retry_keys.add(key)
+
+            batch = service.new_batch_http_request(callback=_callback)
+            for j, key in enumerate(batch_keys):
+                batch.add(requests[key], request_id=str(j))
+
+            batch.execute()
+
+        if not retry_keys:
+            break
+
+        keys = [key for key in keys if key in retry_keys]
+
+    return responses
+
+
+@contextmanager
+def mapped_media(read_path, chunksize, mimetype=None):
+    """
+    Resumable upload of a local file whose chunks are sliced from a read-only memory map rather than read through a buffered file object. The file is closed on exit.
+
+    :param read_path: Local path of file to upload.
+    :type read_path: string
+    :param chunksize: Upload chunk size, a multiple of 256KB.
+    :type chunksize: integer
+    :param mimetype: If None, guessed from read_path, falling back to 'application/octet-stream'.
+    :type mimetype: string
+    :return: Context manager yielding a googleapiclient.http.MediaIoBaseUpload object.
+    """
+
+    from googleapiclient.http import MediaIoBaseUpload
+
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(read_path)[0] or 'application/octet-stream'
+
+    with io.open(read_path, 'rb') as read_file:
+        if os.fstat(read_file.fileno()).st_size == 0:
+            # empty files can't be mapped
+            yield MediaIoBaseUpload(read_file, mimetype, chunksize=chunksize, resumable=True)
+        else:
+            with mmap.mmap(read_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                yield MediaIoBaseUpload(mapped_file, mimetype, chunksize=chunksize, resumable=True)
+
+
+_SIZE_SUFFIXES = ('kB', 'MB', 'GB', 'TB', 'PB', 'EB', 'ZB', 'YB')
+
+
+def naturalsize(value):
+    """
+    Human readable file size in decimal units, eg. '10.5 MB'. Values which would round up to 1000 carry over to the next unit, eg. '1.0 GB' rather than '1000.0 MB'.
+
+    :param value: Number of bytes.
+    :type value: integer
+    :return: String representation of size.
+    """
+
+    value = float(value)
+    abs_value = abs(value)
+
+    if abs_value == 1:
+        return '%d Byte' % value
+    elif abs_value < 1000:
+        return '%d Bytes' % value
+
+    for i, suffix in enumerate(_SIZE_SUFFIXES):
+        unit = 1000 ** (i + 2)
+        if round(1000 * abs_value / unit, 1) < 1000:
+            return '%.1f %s' % (1000 * value / unit, suffix)
+
+    return '%.1f %s' % (1000 * value / unit, suffix)
+
+
+# tzinfo objects are reused across conversions, set GWRAPPY_TZ_CACHE=0 if the system timezone changes at runtime
+_TZ_CACHE = os.environ.get('GWRAPPY_TZ_CACHE', '1') != '0'
+
+
+def _load_tz(tz_name):
+    if tz_name is None:
+        return get_localzone()
+    else:
+        return timezone(tz_name)
+
+
+_cached_tz = lru_cache(maxsize=128)(_load_tz)
+
+
+def _get_tz(tz_name):
+    return _cached_tz(tz_name) if _TZ_CACHE else _load_tz(tz_name)
+
+
+_ONE_DAY = timedelta(days=1)
+
+# default formats which datetime.fromisoformat() parses identically, for strings strictly matching the pattern
+_ISO_FORMAT_PATTERNS = {
+    '%Y-%m-%d': re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}'),
+    '%Y-%m-%d %H:%M:%S': re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}')
+}
+
+
+def _parse_datetime(input_value, date_format):
+    # fromisoformat is considerably faster than strptime, which falls back for anything it doesn't accept
+    # it accepts more than strptime on newer pythons, eg. week dates and utc offsets, so only exact matches are passed to it
+    pattern = _ISO_FORMAT_PATTERNS.get(date_format)
+
+    if pattern is not None and pattern.fullmatch(input_value) is not None:
+        try:
+            return datetime.fromisoformat(input_value)
+        except ValueError:
+            pass
+
+    return datetime.strptime(input_value, date_format)
+
 
 def timestamp_to_datetime(input_timestamp, tz=None):
     """
     Converts epoch timestamp into datetime object.
 
     :param input_timestamp: Epoch timestamp. Microsecond or millisecond inputs accepted.
-    :type input_timestamp: long
+    :type input_timestamp: integer
     :param tz: String representation of timezone accepted by pytz. eg. 'Asia/Hong_Kong'. If param is unfilled, system timezone is used.
     :return: timezone aware datetime object
     """
-    input_timestamp = long(input_timestamp)
+    input_timestamp = int(input_timestamp)
 
-    if tz is None:
-        tz = get_localzone()
-    else:
-        tz = timezone(tz)
+    tz = _get_tz(tz)
 
-    # if timestamp granularity is microseconds
-    try:
-        return_value = datetime.fromtimestamp(input_timestamp, tz=tz)
-    except ValueError:
+    # timestamps beyond year 5138 in seconds are taken to be in milliseconds
+    if abs(input_timestamp) > 99999999999:
         input_timestamp = float(input_timestamp)/1000
-        return_value = datetime.fromtimestamp(input_timestamp, tz=tz)
 
-    return return_value
+    return datetime.fromtimestamp(input_timestamp, tz=tz)
 
 
 def datetime_to_timestamp(input_datetime, date_format='%Y-%m-%d %H:%M:%S', tz=None):
@@ -100,26 +248,46 @@ def datetime_to_timestamp(input_datetime, date_format='%Y-%m-%d %H:%M:%S', tz=No
     :param tz: String representation of timezone accepted by pytz. eg. 'Asia/Hong_Kong'. If param is unfilled, system timezone is used.
     :return: timezone aware datetime object
     """
-    epoch = timezone('UTC').localize(datetime.utcfromtimestamp(0))
-
     if isinstance(input_datetime, str):
-        input_datetime = datetime.strptime(input_datetime, date_format)
+        input_datetime = _parse_datetime(input_datetime, date_format)
 
     assert isinstance(input_datetime, datetime)
 
-    if tz is None:
-        tz = get_localzone()
-    else:
-        tz = timezone(tz)
+    tz = _get_tz(tz)
 
     if input_datetime.tzinfo is None:
         input_value = tz.localize(input_datetime)
     else:
         input_value = input_datetime.astimezone(tz)
 
-    return_value = long((input_value - epoch).total_seconds())
+    return int(input_value.timestamp())
 
-    return return_value
+
+def rfc3339_to_datetime(input_value):
+    """
+    Parses RFC 3339 timestamps returned by Google APIs, eg. '2016-12-28T08:40:21.123Z'.
+
+    Faster than datetime.strptime() and tolerant of the varying fractional second precision (none, milli, micro or nano) across APIs.
+
+    :param input_value: RFC 3339 timestamp.
+    :type input_value: string
+    :return: timezone aware datetime object
+    """
+
+    if input_value.endswith('Z'):
+        input_value = input_value[:-1] + '+00:00'
+
+    date_part, sep, fraction = input_value.partition('.')
+
+    # fromisoformat only accepts 3 or 6 fractional digits, truncate nanoseconds and pad the rest
+    if sep:
+        i = 0
+        while i < len(fraction) and fraction[i].isdigit():
+            i += 1
+
+        input_value = '%s.%s%s' % (date_part, fraction[:min(i, 6)].ljust(6, '0'), fraction[i:])
+
+    return datetime.fromisoformat(input_value)
 
 
 def date_range(start, end, ascending=True, date_format='%Y-%m-%d'):
@@ -136,12 +304,12 @@ def date_range(start, end, ascending=True, date_format='%Y-%m-%d'):
     :return: generator object for naive datetime objects
     """
     if isinstance(start, str):
-        start_date = datetime.strptime(start, date_format)
+        start_date = _parse_datetime(start, date_format)
     else:
         start_date = start.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
 
     if isinstance(end, str):
-        end_date = datetime.strptime(end, date_format)
+        end_date = _parse_datetime(end, date_format)
     else:
         end_date = end.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
 
@@ -149,8 +317,12 @@ def date_range(start, end, ascending=True, date_format='%Y-%m-%d'):
 
     days_apart = (end_date - start_date).days + 1
 
-    for i in (range(0, days_apart) if ascending else range(0, days_apart)[::-1]):
-        yield start_date + timedelta(i)
+    temp_date = start_date if ascending else end_date
+    step = _ONE_DAY if ascending else -_ONE_DAY
+
+    for _ in range(days_apart):
+        yield temp_date
+        temp_date += step
 
 
 def month_range(start, end, full_months=False, month_format='%Y-%m', ascending=True, date_format='%Y-%m-%d'):
@@ -167,18 +339,25 @@ def month_range(start, end, full_months=False, month_format='%Y-%m', ascending=T
     """
 
     def is_last_day(input_date):
-        return input_date == (input_date.replace(day=1) + relativedelta(months=1) - timedelta(days=1))
+        return input_date.day == calendar.monthrange(input_date.year, input_date.month)[1]
 
     date_dict = {}
-    for temp_date in date_range(start, end, date_format=date_format):
-        month_key = temp_date.strftime(month_format)
-        date_dict.setdefault(month_key, [])
-        date_dict[month_key].append(temp_date)
+    prev_month = None
+
+    # dates are already generated in the requested order, so each list is built sorted
+    for temp_date in date_range(start, end, ascending=ascending, date_format=date_format):
+        # month_key is only formatted once per month
+        cur_month = (temp_date.year, temp_date.month)
+        if cur_month != prev_month:
+            month_dates = date_dict.setdefault(temp_date.strftime(month_format), [])
+            prev_month = cur_month
+
+        month_dates.append(temp_date)
 
     if full_months:
-        return {k: sorted(v, reverse=not ascending) for k, v in date_dict.items() if is_last_day(max(v))}
+        return {k: v for k, v in date_dict.items() if is_last_day(v[-1] if ascending else v[0])}
     else:
-        return {k: sorted(v, reverse=not ascending) for k, v in date_dict.items()}
+        return date_dict
 
 
 def simple_mail(send_to, subject, text, send_from=None, username=None, password=None, server='smtp.gmail.com', port=587):
@@ -199,8 +378,7 @@ def simple_mail(send_to, subject, text, send_from=None, username=None, password=
     """
 
     import smtplib
-    from email.mime.multipart import MIMEMultipart
-    from email.mime.text import MIMEText
+    from email.message import EmailMessage
     from email.utils import COMMASPACE, formatdate
 
     assert username is not None and password is not None
@@ -211,13 +389,14 @@ def simple_mail(send_to, subject, text, send_from=None, username=None, password=
     if not isinstance(send_to, list):
         send_to = [send_to]
 
-    message = MIMEMultipart()
+    # single part text message, no multipart container needed without attachments
+    message = EmailMessage()
     message['From'] = send_from
     message['To'] = COMMASPACE.join(send_to)
     message['Date'] = formatdate(localtime=True)
     message['Subject'] = subject
 
-    message.attach(MIMEText(text))
+    message.set_content(text)
 
     smtp = smtplib.SMTP(server, port)
     smtp.starttls()
@@ -227,15 +406,118 @@ def simple_mail(send_to, subject, text, send_from=None, username=None, password=
     smtp.quit()
 
 
+class BackgroundWriter:
+    def __init__(self, fd, max_pending=4):
+        """
+        File-like wrapper that hands writes to a background thread, so disk writes overlap with fetching the next chunk over the network.
+
+        |  eg. MediaIoBaseDownload(BackgroundWriter(write_file), req)
+
+        :param fd: Writable file object.
+        :param max_pending: Number of chunks that can be queued before write() blocks, bounding memory usage.
+        :type max_pending: integer
+        """
+
+        self._fd = fd
+        self._queue = Queue(maxsize=max_pending)
+        self._error = None
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+
+            # None is the sentinel queued by close()
+            if data is None:
+                break
+
+            # keep draining after a failure so write() never blocks on a full queue
+            if self._error is None:
+                try:
+                    self._fd.write(data)
+                except Exception as e:
+                    self._error = e
+
+    def write(self, data):
+        if self._error is not None:
+            raise self._error
+
+        self._queue.put(data)
+        return len(data)
+
+    def close(self):
+        """
+        Waits for queued writes to be flushed to the underlying file object.
+
+        :raises: Exception raised by the underlying file object while writing.
+        """
+
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # don't mask an exception raised within the block with a write error
+        try:
+            self.close()
+        except Exception:
+            if exc_type is None:
+                raise
+
+
+class _RecordHandler(logging.Handler):
+    def __init__(self, max_records=None):
+        # records are only formatted when the log string is requested
+        super().__init__()
+        self.records = deque(maxlen=max_records)
+
+    def emit(self, record):
+        # like QueueHandler.prepare(), the message and traceback are rendered now
+        # so args mutated later don't change the log, and traceback frames aren't kept alive
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+        record.exc_info = None
+
+        self.records.append(record)
+
+    def getvalue(self):
+        return ''.join('%s\n' % self.format(record) for record in self.records)
+
+
+class _LoggingFilter(logging.Filter):
+    def __init__(self, ignore_modules):
+        super().__init__()
+        self._ignore = frozenset(ignore_modules)
+
+    def filter(self, record):
+        # still lets WARNING, ERROR and CRITICAL through
+        return record.name not in self._ignore or record.levelno >= logging.WARNING
+
+
 class StringLogger:
-    def __init__(self, name=None, level=logging.INFO, formatter=None, ignore_modules=None):
+    def __init__(self, name=None, level=logging.INFO, formatter=None, ignore_modules=None, max_records=None):
         """
-        Simple logging wrapper with a string buffer handler to easily write and retrieve logs as strings.
+        Simple logging wrapper with a buffering handler to easily write and retrieve logs as strings.
 
         :param name: Name of logger
         :param level: Logging level
         :param formatter: logging.Formatter() object
         :param ignore_modules: list of module names to ignore from logging process
+        :param max_records: If filled, only the latest max_records records are kept.
+        :type max_records: integer
         """
 
         self.logger = logging.getLogger(name)
@@ -250,23 +532,18 @@ class StringLogger:
             assert isinstance(formatter, logging.Formatter)
             self._formatter = formatter
 
-        self._log_capture_string = StringIO()
-        sh = logging.StreamHandler(self._log_capture_string)
-        sh.setLevel(level)
-        sh.setFormatter(self._formatter)
+        self._handler = _RecordHandler(max_records)
+        self._handler.setLevel(level)
+        self._handler.setFormatter(self._formatter)
 
-        self.logger.addHandler(sh)
+        self.logger.addHandler(self._handler)
 
         # filters logging for modules in ignore_modules
         if ignore_modules is not None and isinstance(ignore_modules, (list, tuple)):
-            class _LoggingFilter(logging.Filter):
-                def filter(self, record):
-                    # still lets WARNING, ERROR and CRITICAL through
-                    return record.name not in ignore_modules or \
-                           record.levelno in (logging.WARNING, logging.ERROR, logging.CRITICAL)
+            logging_filter = _LoggingFilter(ignore_modules)
 
             for handler in self.logger.handlers:
-                handler.addFilter(_LoggingFilter())
+                handler.addFilter(logging_filter)
 
     def get_logger(self):
         """
@@ -284,7 +561,7 @@ class StringLogger:
         :return: logged data as string
         """
 
-        return self._log_capture_string.getvalue()
+        return self._handler.getvalue()
 
     def close(self):
-        self._log_capture_string.close()
+        self._handler.records.clear()
@@ -10,12 +10,11 @@ with open('HISTORY.rst') as history_file:
 requirements = [
     'google-api-python-client>=1.5.1',
     'oauth2client>=2.0.1,<3.0',
-    'humanize>=0.5.1',
     'unicodecsv>=0.14.1',
     'pytz',
     'tzlocal',
     'tabulate',
-    'python-dateutil'
+    'cachetools'
 ]
 
 setup(
@@ -29,15 +28,22 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=requirements,
+    python_requires='>=3.7',
+    entry_points={
+        'console_scripts': [
+            'gwrappy-refresh-discovery=gwrappy.service:refresh_discovery_documents_cli'
+        ]
+    },
     license="Apache Software License 2.0",
     zip_safe=False,
+    test_suite='tests',
     keywords=['google', 'cloud', 'gcloud'],
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: Apache Software License',
         'Natural Language :: English',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.5'
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only'
     ]
 )
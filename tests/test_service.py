@@ -0,0 +1,62 @@
+import json
+import unittest
+from dataclasses import dataclass
+from datetime import datetime
+
+from googleapiclient.model import JsonModel
+
+from gwrappy.service import orjson, OrjsonModel
+
+
+@dataclass
+class Row:
+    name: str
+
+
+class Name(str):
+    pass
+
+
+@unittest.skipIf(orjson is None, 'orjson is not installed')
+class OrjsonModelTest(unittest.TestCase):
+    def setUp(self):
+        self.model = OrjsonModel()
+        self.default_model = JsonModel()
+
+    def assertSamePayload(self, body_value):
+        self.assertEqual(
+            json.loads(self.model.serialize(body_value)),
+            json.loads(self.default_model.serialize(body_value))
+        )
+
+    def test_plain_body(self):
+        self.assertSamePayload({'rows': [{'json': {'a': 1, 'b': 1.5, 'c': None, 'd': True, 'e': 'x'}}]})
+
+    def test_fallback_for_large_integers(self):
+        self.assertEqual(self.model.serialize({'a': 2 ** 70}), json.dumps({'a': 2 ** 70}))
+
+    def test_fallback_for_non_string_keys(self):
+        self.assertSamePayload({1: 'a'})
+
+    def test_fallback_for_subclasses(self):
+        self.assertSamePayload({'name': Name('a')})
+
+    def test_fallback_raises_for_datetimes(self):
+        with self.assertRaises(TypeError):
+            self.model.serialize({'a': datetime(2017, 1, 1)})
+
+    def test_fallback_raises_for_dataclasses(self):
+        with self.assertRaises(TypeError):
+            self.model.serialize({'row': Row('a')})
+
+    def test_nan_encoded_as_null(self):
+        self.assertEqual(json.loads(self.model.serialize({'a': float('nan')})), {'a': None})
+
+    def test_data_wrapper(self):
+        model = OrjsonModel(data_wrapper=True)
+        self.assertEqual(json.loads(model.serialize({'a': 1})), {'data': {'a': 1}})
+        self.assertEqual(model.deserialize(b'{"data": {"a": 1}}'), {'a': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from gwrappy.utils import execute_batch
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id):
+        self._requests.append((request_id, request))
+
+    def execute(self):
+        self._service.batches.append([request for _, request in self._requests])
+
+        for request_id, request in self._requests:
+            status = self._service.statuses[request].pop(0)
+            if status == 200:
+                self._callback(request_id, {'id': request}, None)
+            else:
+                self._callback(request_id, None, HttpError(httplib2.Response({'status': status}), b''))
+
+
+class FakeService:
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.batches = []
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+
+@mock.patch('gwrappy.utils.sleep')
+class ExecuteBatchTest(unittest.TestCase):
+    def test_retries_only_failed_requests(self, mock_sleep):
+        service = FakeService({'a': [200], 'b': [429, 200], 'c': [200]})
+
+        resp = execute_batch(service, {'a': 'a', 'b': 'b', 'c': 'c'}, batch_size=2)
+
+        self.assertEqual(resp, {'a': {'id': 'a'}, 'b': {'id': 'b'}, 'c': {'id': 'c'}})
+        self.assertEqual(service.batches, [['a', 'b'], ['c'], ['b']])
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    def test_non_retryable_error_returned(self, mock_sleep):
+        service = FakeService({'a': [200], 'b': [404]})
+
+        resp = execute_batch(service, {'a': 'a', 'b': 'b'})
+
+        self.assertEqual(resp['a'], {'id': 'a'})
+        self.assertIsInstance(resp['b'], HttpError)
+        self.assertEqual(service.batches, [['a', 'b']])
+        mock_sleep.assert_not_called()
+
+    def test_error_returned_once_retries_exhausted(self, mock_sleep):
+        service = FakeService({'a': [503, 503, 503]})
+
+        resp = execute_batch(service, {'a': 'a'}, max_retries=2)
+
+        self.assertIsInstance(resp['a'], HttpError)
+        self.assertEqual(resp['a'].resp.status, 503)
+        self.assertEqual(len(service.batches), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()